@@ -0,0 +1,136 @@
+"""
+A local, OpenAI-compatible streaming chat-completions server with tunable
+latency, throughput and failure rate, for benchmarks and failover drills.
+
+    python -m benchmarks.fake_openai_server --port 9000 --ttft 0.3 --tokens-per-second 80
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+@dataclass
+class FakeServerConfig:
+    ttft: float = 0.2                # seconds before the first chunk
+    tokens_per_second: float = 100.0
+    error_rate: float = 0.0          # share of requests answered with `error_status`
+    error_status: int = 500
+    chunk_size: int = 1              # tokens per streamed chunk
+    completion_tokens: int = 128     # response length when the request sets no max_tokens
+    fail_first: int = 0              # answer the first N requests with `error_status`
+
+
+def create_app(config: FakeServerConfig) -> FastAPI:
+    app = FastAPI()
+    # Requests received so far, for tests that count upstream calls
+    app.state.requests = 0
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        if app.state.requests <= config.fail_first or random.random() < config.error_rate:
+            return JSONResponse(
+                {"error": {"message": "injected failure", "type": "server_error"}},
+                status_code=config.error_status,
+            )
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = body.get("model", "fake-model")
+        total = min(body.get("max_tokens") or config.completion_tokens, config.completion_tokens)
+        prompt_tokens = sum(len(str(m.get("content", ""))) // 4 for m in body.get("messages", []))
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        def event(choices, usage=None) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": choices,
+            }
+            if usage is not None:
+                payload["usage"] = usage
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def stream():
+            await asyncio.sleep(config.ttft)
+            yield event([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+            sent = 0
+            while sent < total:
+                size = min(config.chunk_size, total - sent)
+                yield event([{"index": 0, "delta": {"content": " tok" * size}, "finish_reason": None}])
+                sent += size
+                await asyncio.sleep(size / config.tokens_per_second)
+            yield event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if include_usage:
+                yield event([], {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": total,
+                    "total_tokens": prompt_tokens + total,
+                })
+            yield "data: [DONE]\n\n"
+
+        if not body.get("stream"):
+            await asyncio.sleep(config.ttft + total / config.tokens_per_second)
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": " tok" * total},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": total,
+                          "total_tokens": prompt_tokens + total},
+            })
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+
+def start_in_thread(config: FakeServerConfig, port: int, host: str = "127.0.0.1") -> uvicorn.Server:
+    """Runs the fake server in a daemon thread and returns once it accepts connections."""
+    server = uvicorn.Server(uvicorn.Config(create_app(config), host=host, port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="fake-openai", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible streaming server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--ttft", type=float, default=FakeServerConfig.ttft)
+    parser.add_argument("--tokens-per-second", type=float, default=FakeServerConfig.tokens_per_second)
+    parser.add_argument("--error-rate", type=float, default=FakeServerConfig.error_rate)
+    parser.add_argument("--error-status", type=int, default=FakeServerConfig.error_status)
+    parser.add_argument("--chunk-size", type=int, default=FakeServerConfig.chunk_size)
+    parser.add_argument("--completion-tokens", type=int, default=FakeServerConfig.completion_tokens)
+    args = parser.parse_args()
+
+    config = FakeServerConfig(
+        ttft=args.ttft,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        chunk_size=args.chunk_size,
+        completion_tokens=args.completion_tokens,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
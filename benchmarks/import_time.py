@@ -0,0 +1,95 @@
+"""
+Cold-start budget check: how long importing the agent modules takes in a fresh
+interpreter, with a `python -X importtime` breakdown of the slowest imports.
+
+    python -m benchmarks.import_time                       # every agent module
+    python -m benchmarks.import_time --module src.dobby_forge.rizzy_agent --budget-ms 800
+
+Exits with status 1 when any module's median import time exceeds the budget.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = (
+    "src.dobby_forge.host",
+    "src.dobby_forge.dobby_forge",
+    "src.dobby_forge.dobby_agent",
+    "src.dobby_forge.rizzy_agent",
+    "src.dobby_forge.human_text",
+)
+
+
+def time_import(module: str) -> float:
+    """Wall-clock seconds for a fresh interpreter to import `module` and exit."""
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", f"import {module}"], cwd=REPO_ROOT, check=True)
+    return time.perf_counter() - started
+
+
+def import_breakdown(module: str) -> List[Tuple[int, str]]:
+    """(cumulative microseconds, package) for each top-level package imported, slowest first."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, check=True, capture_output=True, text=True,
+    )
+    entries = []
+    for line in result.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, package = line[len("import time:"):].split("|")
+        package = package.strip()
+        # Submodules are already counted in their package's cumulative time
+        if "." in package:
+            continue
+        entries.append((int(cumulative), package))
+    return sorted(entries, reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time of the agent modules.")
+    parser.add_argument("--module", action="append", help="module to import (repeatable; default: all agents)")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per module; the median is used")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("DOBBY_IMPORT_BUDGET_MS", "1500")))
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list per module")
+    parser.add_argument("--output", help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    # Empty interpreter start-up, subtracted so the budget covers only our imports
+    baseline = statistics.median(time_import("sys") for _ in range(args.runs))
+    print(f"Interpreter start-up: {baseline * 1000:.0f} ms (subtracted)")
+
+    results, over_budget = {}, []
+    for module in args.module or DEFAULT_MODULES:
+        median = statistics.median(time_import(module) for _ in range(args.runs)) - baseline
+        breakdown = import_breakdown(module)
+        results[module] = {
+            "import_ms": median * 1000,
+            "slowest": [{"package": package, "cumulative_ms": us / 1000} for us, package in breakdown[:args.top]],
+        }
+        status = "OK" if median * 1000 <= args.budget_ms else "OVER BUDGET"
+        print(f"\n{module}: {median * 1000:.0f} ms (budget {args.budget_ms:.0f} ms) {status}")
+        for us, package in breakdown[:args.top]:
+            print(f"  {us / 1000:>8.1f} ms  {package}")
+        if status != "OK":
+            over_budget.append(module)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"budget_ms": args.budget_ms, "modules": results}, f, indent=2)
+
+    if over_budget:
+        print(f"\nImport budget exceeded by: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Load generator for ModelProvider and the agent HTTP endpoints.
+
+    # Drive ModelProvider.query_stream against an in-process fake server
+    python -m benchmarks.run_benchmark provider --concurrency 32 --requests 500
+
+    # Drive an agent served by DefaultServer / the multi-agent host
+    python -m benchmarks.run_benchmark agent --url http://localhost:8000/rizzy/assist --server-pid 1234
+
+Results are written as JSON; pass --baseline to compare against an earlier run.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import time
+from typing import List, Optional
+
+import httpx
+
+from benchmarks.fake_openai_server import FakeServerConfig, start_in_thread
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+# Metrics compared against a baseline; all are "lower is better" except throughput
+COMPARED_METRICS = ("throughput_rps", "ttft_p50", "ttft_p95", "ttft_p99", "latency_p50", "latency_p95",
+                    "latency_p99", "cpu_seconds_per_request")
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def process_usage(pid: Optional[int]) -> dict:
+    """CPU seconds and resident memory of `pid` (Linux /proc), or of this process."""
+    if pid is None:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return {"cpu": usage.ru_utime + usage.ru_stime, "rss_kb": usage.ru_maxrss}
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    ticks = os.sysconf(os.sysconf_names["SC_CLK_TCK"])
+    cpu = (int(fields[11]) + int(fields[12])) / ticks
+    rss_kb = 0
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                rss_kb = int(line.split()[1])
+    return {"cpu": cpu, "rss_kb": rss_kb}
+
+
+async def provider_request(provider, prompt: str) -> dict:
+    started = time.monotonic()
+    ttft = None
+    async for _ in provider.query_stream(prompt):
+        if ttft is None:
+            ttft = time.monotonic() - started
+    return {"ttft": ttft, "latency": time.monotonic() - started}
+
+
+def assist_payload(prompt: str) -> dict:
+    from ulid import ULID
+    return {
+        "query": {"id": str(ULID()), "prompt": prompt},
+        "session": {
+            "processor_id": "benchmark",
+            "activity_id": str(ULID()),
+            "request_id": str(ULID()),
+            "interactions": [],
+        },
+    }
+
+
+async def agent_request(client: httpx.AsyncClient, url: str, prompt: str) -> dict:
+    """POSTs one Sentient assist request and times the first FINAL_RESPONSE event."""
+    started = time.monotonic()
+    ttft = None
+    async with client.stream("POST", url, json=assist_payload(prompt)) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if ttft is None and line.startswith("event:") and "FINAL_RESPONSE" in line:
+                ttft = time.monotonic() - started
+            if line.startswith("event:") and line.split(":", 1)[1].strip().lower() == "done":
+                break
+    return {"ttft": ttft, "latency": time.monotonic() - started}
+
+
+async def run_load(make_request, concurrency: int, requests: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    samples, errors = [], 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            try:
+                samples.append(await make_request())
+            except Exception:
+                errors += 1
+
+    started = time.monotonic()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.monotonic() - started
+
+    ttfts = [s["ttft"] for s in samples if s["ttft"] is not None]
+    latencies = [s["latency"] for s in samples]
+    return {
+        "requests": requests,
+        "errors": errors,
+        "concurrency": concurrency,
+        "elapsed": elapsed,
+        "throughput_rps": len(samples) / elapsed if elapsed else 0.0,
+        "ttft_p50": percentile(ttfts, 50),
+        "ttft_p95": percentile(ttfts, 95),
+        "ttft_p99": percentile(ttfts, 99),
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "latency_p99": percentile(latencies, 99),
+    }
+
+
+async def run(args) -> dict:
+    if args.mode == "provider":
+        from src.dobby_forge.providers.model_provider import ModelProvider
+
+        base_url = args.base_url
+        if base_url is None:
+            start_in_thread(FakeServerConfig(
+                ttft=args.ttft,
+                tokens_per_second=args.tokens_per_second,
+                error_rate=args.error_rate,
+                chunk_size=args.chunk_size,
+                completion_tokens=args.completion_tokens,
+            ), args.fake_port)
+            base_url = f"http://127.0.0.1:{args.fake_port}/v1"
+        provider = ModelProvider(api_key="benchmark", base_url=base_url, model="fake-model",
+                                 agent_name="benchmark")
+        make_request = lambda: provider_request(provider, args.prompt)
+        # Measures this process (peak RSS), which also hosts the fake server when it is built in
+        pid = None
+    else:
+        client = httpx.AsyncClient(timeout=None, limits=httpx.Limits(max_connections=args.concurrency))
+        make_request = lambda: agent_request(client, args.url, args.prompt)
+        pid = args.server_pid
+
+    before = process_usage(pid)
+    result = await run_load(make_request, args.concurrency, args.requests)
+    after = process_usage(pid)
+    completed = max(1, result["requests"] - result["errors"])
+    result.update({
+        "mode": args.mode,
+        "cpu_seconds_per_request": (after["cpu"] - before["cpu"]) / completed,
+        "rss_kb": after["rss_kb"],
+        "rss_kb_delta_per_request": (after["rss_kb"] - before["rss_kb"]) / completed,
+    })
+    return result
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Returns a line per metric that regressed by more than `tolerance` (a fraction)."""
+    regressions = []
+    for metric in COMPARED_METRICS:
+        new, old = result.get(metric), baseline.get(metric)
+        if not new or not old:
+            continue
+        change = (new - old) / old
+        worse = change < -tolerance if metric == "throughput_rps" else change > tolerance
+        print(f"  {metric:<26} {old:>10.4f} -> {new:>10.4f} ({change:+.1%})")
+        if worse:
+            regressions.append(f"{metric} regressed {change:+.1%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ModelProvider or an agent endpoint.")
+    parser.add_argument("mode", choices=("provider", "agent"))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--prompt", default="Write a tweet about self-custody.")
+    parser.add_argument("--url", help="agent mode: the /assist endpoint to drive")
+    parser.add_argument("--server-pid", type=int, help="agent mode: measure CPU/memory of this process")
+    parser.add_argument("--base-url", help="provider mode: use this server instead of the built-in fake")
+    parser.add_argument("--fake-port", type=int, default=9100)
+    parser.add_argument("--ttft", type=float, default=0.2)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--chunk-size", type=int, default=1)
+    parser.add_argument("--completion-tokens", type=int, default=128)
+    parser.add_argument("--output", help="where to save results (default: benchmarks/results/<mode>.json)")
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed regression, as a fraction")
+    args = parser.parse_args()
+    if args.mode == "agent" and not args.url:
+        parser.error("agent mode needs --url")
+
+    # Read the baseline first: it may be the file this run is about to overwrite
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    result = asyncio.run(run(args))
+    print(json.dumps(result, indent=2))
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{args.mode}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Saved results to {output}")
+
+    if baseline is not None:
+        print(f"Compared with {args.baseline}:")
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print("Regressions: " + "; ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
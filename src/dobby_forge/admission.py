@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, replace
+from typing import AsyncIterator, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot get a generation slot before its queue deadline."""
+
+
+@dataclass(frozen=True)
+class AdmissionConfig:
+    """
+    Adaptive concurrency limit for one agent. The limit grows by `increase`
+    per window of healthy requests and shrinks by `decrease` when a request
+    fails or its TTFT exceeds `target_ttft`. Up to `queue_size` requests wait
+    for a slot, each for at most `queue_timeout` seconds.
+    """
+    initial_limit: int = 16
+    min_limit: int = 1
+    max_limit: int = 128
+    target_ttft: float = 2.0
+    increase: float = 1.0
+    decrease: float = 0.7
+    queue_size: int = 256
+    queue_timeout: float = 10.0
+
+    @classmethod
+    def from_env(cls, base: Optional["AdmissionConfig"] = None) -> "AdmissionConfig":
+        """Applies DOBBY_ADMISSION_* overrides on top of `base` (an agent's own defaults)."""
+        base = base or cls()
+        return replace(
+            base,
+            initial_limit=int(os.getenv("DOBBY_ADMISSION_LIMIT", base.initial_limit)),
+            min_limit=int(os.getenv("DOBBY_ADMISSION_MIN_LIMIT", base.min_limit)),
+            max_limit=int(os.getenv("DOBBY_ADMISSION_MAX_LIMIT", base.max_limit)),
+            target_ttft=float(os.getenv("DOBBY_ADMISSION_TARGET_TTFT", base.target_ttft)),
+            queue_size=int(os.getenv("DOBBY_ADMISSION_QUEUE", base.queue_size)),
+            queue_timeout=float(os.getenv("DOBBY_ADMISSION_TIMEOUT", base.queue_timeout)),
+        )
+
+
+def session_key(session) -> str:
+    """Fairness key for a Sentient session: its activity, falling back to the processor."""
+    for attribute in ("activity_id", "processor_id"):
+        value = getattr(session, attribute, None)
+        if value:
+            return str(value)
+    return "anonymous"
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limiter in front of upstream generation. Waiting requests
+    are queued per session and admitted round-robin, so one chatty session
+    cannot starve the others.
+    """
+
+    def __init__(self, config: Optional[AdmissionConfig] = None, name: str = "default"):
+        self.config = config or AdmissionConfig()
+        self.name = name
+        self.limit = float(self.config.initial_limit)
+        self.inflight = 0
+        self.admitted = 0
+        self.rejected = 0
+        # Session key -> its waiting futures; the dict order is the round-robin order
+        self._waiters: "OrderedDict[str, deque]" = OrderedDict()
+        self._queued = 0
+        self._last_decrease = 0.0
+
+    async def acquire(self, key: str):
+        """Takes a slot, waiting in the session's queue; raises AdmissionRejected."""
+        if self.inflight < int(self.limit) and not self._queued:
+            self.inflight += 1
+            self.admitted += 1
+            return
+        if self._queued >= self.config.queue_size:
+            self._reject(f"queue full ({self._queued} waiting)")
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, deque()).append(future)
+        self._queued += 1
+        try:
+            # Not wait_for: on Python 3.11 it swallows a cancellation that races with
+            # the grant, leaving a departed caller holding the slot
+            await asyncio.wait((future,), timeout=self.config.queue_timeout)
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The caller went away after being granted; hand the slot on
+                self.release()
+            else:
+                future.cancel()
+                self._forget(key, future)
+            raise
+        if not future.done():
+            future.cancel()
+            self._forget(key, future)
+            self._reject(f"no slot within {self.config.queue_timeout:g}s")
+        self.admitted += 1
+
+    def release(self):
+        self.inflight -= 1
+        self._admit_waiters()
+
+    def record(self, ttft: Optional[float], failed: bool = False):
+        """Adjusts the limit from one finished request."""
+        config = self.config
+        if failed or (ttft is not None and ttft > config.target_ttft):
+            now = time.monotonic()
+            # Requests that were already in flight report the same congestion; back off once
+            if now - self._last_decrease >= config.target_ttft:
+                self._last_decrease = now
+                self.limit = max(config.min_limit, self.limit * config.decrease)
+                logger.info("[%s] Concurrency limit lowered to %d", self.name, int(self.limit))
+        else:
+            self.limit = min(config.max_limit, self.limit + config.increase / self.limit)
+            self._admit_waiters()
+
+    async def stream(self, key: str, open_source: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """
+        Yields the chunks of `open_source()` once a slot is free, feeding its TTFT
+        and outcome back into the limit.
+        """
+        await self.acquire(key)
+        started = time.monotonic()
+        ttft = None
+        failed = False
+        source = open_source()
+        try:
+            async for chunk in source:
+                if ttft is None:
+                    ttft = time.monotonic() - started
+                yield chunk
+        except Exception:
+            failed = True
+            raise
+        finally:
+            await source.aclose()
+            # A consumer that left before the first chunk tells us nothing about upstream health
+            if ttft is not None or failed:
+                self.record(ttft, failed)
+            self.release()
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": int(self.limit),
+            "inflight": self.inflight,
+            "queued": self._queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+    def _admit_waiters(self):
+        while self._waiters and self.inflight < int(self.limit):
+            key, queue = next(iter(self._waiters.items()))
+            future = queue.popleft()
+            self._queued -= 1
+            if queue:
+                self._waiters.move_to_end(key)
+            else:
+                del self._waiters[key]
+            if not future.done():
+                self.inflight += 1
+                future.set_result(None)
+
+    def _forget(self, key: str, future: asyncio.Future):
+        queue = self._waiters.get(key)
+        if queue is None or future not in queue:
+            return
+        queue.remove(future)
+        self._queued -= 1
+        if not queue:
+            del self._waiters[key]
+
+    def _reject(self, reason: str):
+        self.rejected += 1
+        logger.warning("[%s] Rejected request: %s (limit=%d)", self.name, reason, int(self.limit))
+        raise AdmissionRejected(
+            "Dobby is handling too many requests right now. Please try again in a moment."
+        )
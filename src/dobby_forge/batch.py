@@ -0,0 +1,244 @@
+"""
+Runs DobbyAgentForge's task pipeline over a JSONL file of specs, without the
+HTTP server. Each input line is a JSON object of forge options (persona,
+style, loyalty, task, content, temperature, top_p, max_tokens) plus an
+optional "id".
+
+    python -m src.dobby_forge.batch specs.jsonl results.jsonl --concurrency 16
+
+Results are appended to the output as they complete. Progress is checkpointed
+next to the output, so rerunning the same command after a crash resumes
+without redoing finished rows.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from typing import Iterator, Set
+
+from dotenv import load_dotenv
+
+from src.dobby_forge.dobby_forge import build_task_request
+from src.dobby_forge.log import configure_logging
+from src.dobby_forge.metrics import MetricsSink, MultiSink, get_metrics_sink, set_metrics_sink
+from src.dobby_forge.providers.model_provider import ModelProvider
+from src.dobby_forge.providers.response_cache import get_default_cache
+
+logger = logging.getLogger(__name__)
+
+# Agent label for this tool's requests in metrics
+BATCH_AGENT = "batch"
+
+
+class Checkpoint:
+    """
+    Progress as `next_line` (the first input line never started) plus the lines
+    started but not yet written. Everything else below `next_line` is done, so
+    the file stays small however large the input is.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.next_line = 0
+        self.inflight: Set[int] = set()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            state = json.load(f)
+        self.next_line = state["next_line"]
+        self.inflight = set(state["inflight"])
+
+    def save(self):
+        # Write-then-rename so a crash never leaves a half-written checkpoint
+        temp = f"{self.path}.tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump({"next_line": self.next_line, "inflight": sorted(self.inflight)}, f)
+        os.replace(temp, self.path)
+
+    def is_done(self, line: int) -> bool:
+        return line < self.next_line and line not in self.inflight
+
+
+class BatchTotals(MetricsSink):
+    """Counts this run's requests and tokens from the metrics records."""
+
+    def __init__(self):
+        self.requests = 0
+        self.cache_hits = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def emit(self, record: dict):
+        if record["type"] != "request" or record["agent"] != BATCH_AGENT:
+            return
+        self.requests += 1
+        self.errors += bool(record["error"])
+        if record["source"] == "cache":
+            # Replayed from the response cache: no upstream tokens were billed
+            self.cache_hits += 1
+            return
+        self.prompt_tokens += record["prompt_tokens"] or 0
+        self.completion_tokens += record["completion_tokens"] or 0
+
+    def cost(self, price_in: float, price_out: float) -> float:
+        """Upstream spend in dollars, from per-million-token prices."""
+        return (self.prompt_tokens * price_in + self.completion_tokens * price_out) / 1_000_000
+
+
+def repair_output(path: str, lines: Set[int]) -> Set[int]:
+    """
+    Drops a partially written last line (from a crash mid-write) and returns
+    which of `lines` (the checkpoint's in-flight rows) are already in the output.
+    """
+    written = set()
+    if not os.path.exists(path):
+        return written
+    with open(path, "rb+") as f:
+        valid_end = 0
+        for raw in iter(f.readline, b""):
+            if not raw.endswith(b"\n"):
+                break
+            valid_end += len(raw)
+            try:
+                line = json.loads(raw)["line"]
+            except (ValueError, KeyError):
+                continue
+            if line in lines:
+                written.add(line)
+        f.truncate(valid_end)
+    return written
+
+
+class BatchRunner:
+    def __init__(self, provider: ModelProvider, args):
+        self.provider = provider
+        self.args = args
+        self.checkpoint = Checkpoint(args.checkpoint or f"{args.output}.ckpt")
+        self.totals = BatchTotals()
+        self.completed = 0
+        self.failed = 0
+        self.skipped = 0
+        self._output = None
+        # stream_many index -> (input line, spec id); holds only in-flight rows
+        self._rows = {}
+        self._issued = 0
+        self._started = time.monotonic()
+        self._last_report = 0.0
+
+    def specs(self) -> Iterator[dict]:
+        """Reads the input lazily, yielding requests for rows that still need a model call."""
+        with open(self.args.input, encoding="utf-8") as f:
+            for line, raw in enumerate(f):
+                if self.checkpoint.is_done(line):
+                    self.skipped += 1
+                    continue
+                if not raw.strip():
+                    self._advance(line)
+                    continue
+                try:
+                    spec = json.loads(raw)
+                    if not isinstance(spec, dict):
+                        raise ValueError("each line must be a JSON object")
+                    request = build_task_request(spec)
+                except (ValueError, TypeError, AttributeError) as e:
+                    # Bad rows are reported in the output rather than stopping the run
+                    self._write({"line": line, "id": None, "error": f"Invalid spec: {e}"})
+                    self.failed += 1
+                    self._advance(line)
+                    # Saved now, or a crash before the next save would write the row again
+                    self.checkpoint.save()
+                    continue
+                self._rows[self._issued] = (line, spec.get("id"))
+                self._issued += 1
+                self.checkpoint.inflight.add(line)
+                self._advance(line)
+                yield request
+
+    async def run(self):
+        self.checkpoint.load()
+        # Rows written just before a crash, after the last checkpoint save, count as done
+        self.checkpoint.inflight -= repair_output(self.args.output, self.checkpoint.inflight)
+
+        with open(self.args.output, "a", encoding="utf-8") as self._output:
+            async for index, result in self.provider.stream_many(self.specs(), concurrency=self.args.concurrency):
+                line, spec_id = self._rows.pop(index)
+                if isinstance(result, Exception):
+                    self.failed += 1
+                    self._write({"line": line, "id": spec_id, "error": str(result)})
+                else:
+                    self.completed += 1
+                    self._write({"line": line, "id": spec_id, "output": result})
+                self.checkpoint.inflight.discard(line)
+                self.checkpoint.save()
+                self._report()
+        self.checkpoint.save()
+        self._report(final=True)
+
+    def _advance(self, line: int):
+        self.checkpoint.next_line = max(self.checkpoint.next_line, line + 1)
+
+    def _write(self, row: dict):
+        self._output.write(json.dumps(row, ensure_ascii=False) + "\n")
+        # Flushed before the checkpoint moves past the row
+        self._output.flush()
+
+    def _report(self, final: bool = False):
+        now = time.monotonic()
+        if not final and now - self._last_report < self.args.progress_interval:
+            return
+        self._last_report = now
+        elapsed = max(now - self._started, 1e-9)
+        totals = self.totals
+        print(
+            f"{'done' if final else 'progress'}: {self.completed} ok, {self.failed} failed, "
+            f"{self.skipped} skipped | {self.completed / elapsed:.2f} rows/s, "
+            f"{totals.completion_tokens / elapsed:.0f} out tok/s | "
+            f"tokens in={totals.prompt_tokens} out={totals.completion_tokens} "
+            f"cache hits={totals.cache_hits} | cost ${totals.cost(self.args.price_in, self.args.price_out):.4f}",
+            file=sys.stderr,
+            flush=True,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run DobbyAgentForge tasks over a JSONL file of specs.")
+    parser.add_argument("input", help="JSONL file, one forge spec object per line")
+    parser.add_argument("output", help="JSONL file results are appended to")
+    parser.add_argument("--checkpoint", help="progress file (default: <output>.ckpt)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--model", help="model id (default: the forge's model)")
+    parser.add_argument("--base-url", help="OpenAI-compatible endpoint (default: MODEL_BASE_URL)")
+    parser.add_argument("--progress-interval", type=float, default=2.0, help="seconds between progress lines")
+    parser.add_argument("--price-in", type=float, default=float(os.getenv("DOBBY_PRICE_INPUT_PER_M", "0.9")),
+                        help="dollars per million prompt tokens")
+    parser.add_argument("--price-out", type=float, default=float(os.getenv("DOBBY_PRICE_OUTPUT_PER_M", "0.9")),
+                        help="dollars per million completion tokens")
+    args = parser.parse_args()
+
+    load_dotenv()
+    configure_logging(logging.WARNING)
+    api_key = os.getenv("MODEL_API_KEY")
+    if not api_key:
+        parser.error("MODEL_API_KEY is not set")
+
+    provider_kwargs = {"model": args.model} if args.model else {}
+    provider = ModelProvider(
+        api_key=api_key,
+        base_url=args.base_url,
+        cache=get_default_cache(),
+        agent_name=BATCH_AGENT,
+        **provider_kwargs,
+    )
+    runner = BatchRunner(provider, args)
+    set_metrics_sink(MultiSink([get_metrics_sink(), runner.totals]))
+    asyncio.run(runner.run())
+
+
+if __name__ == "__main__":
+    main()
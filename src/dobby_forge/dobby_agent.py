@@ -8,29 +8,50 @@ from sentient_agent_framework import (
     Query,
     ResponseHandler
 )
+from src.dobby_forge.admission import AdaptiveLimiter, AdmissionConfig, AdmissionRejected, session_key
 from src.dobby_forge.providers.model_provider import ModelProvider
+from src.dobby_forge.providers.prompts import PromptPrefix
+from src.dobby_forge.metrics import start_metrics_server
+from src.dobby_forge.streaming import pipe_stream
+from src.dobby_forge.log import configure_logging
+from src.dobby_forge.tracing import get_tracer
 from typing import AsyncIterator
 
-load_dotenv()
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 
 class DobbyAgent(AbstractAgent):
+    # Short posts: admit many at once, but give up quickly rather than keep a user waiting
+    admission_config = AdmissionConfig(initial_limit=32, max_limit=128, target_ttft=1.5, queue_timeout=5.0)
+
     def __init__(self, name: str):
         super().__init__(name)
 
         model_api_key = os.getenv("MODEL_API_KEY")
         if not model_api_key:
             raise ValueError("MODEL_API_KEY is not set")
-        self._model_provider = ModelProvider(api_key=model_api_key)
+        self._model_provider = ModelProvider(api_key=model_api_key, agent_name=name)
+        self._admission = AdaptiveLimiter(AdmissionConfig.from_env(self.admission_config), name=name)
 
         self.persona = "rebellious startup founder"
         self.style = "sarcastic and witty"
         self.loyalty = "startups and innovation"
         self.temperature = 0.7
         self.top_p = 0.9
-        self.max_tokens = 256
+        # A ≤280-character post is ~70 tokens; leave a little slack
+        self.max_tokens = 96
+
+        # Persona and task are fixed per agent, so they form a static system prefix
+        self._prefix = PromptPrefix(
+            system=(
+                f"Persona: {self.persona}\n"
+                f"Style: {self.style}\n"
+                f"Loyalty: {self.loyalty}\n\n"
+                f"Task: Write a witty and sarcastic social media post (≤280 characters) "
+                f"that supports startups and innovation, based on the user's idea."
+            )
+        )
 
     async def assist(
         self,
@@ -39,33 +60,44 @@ class DobbyAgent(AbstractAgent):
         response_handler: ResponseHandler
     ):
         """Generate a sarcastic, witty social media post promoting startups and innovation."""
-        await response_handler.emit_text_block(
-            "GENERATE",
-            "Cooking up a brutally honest startup post with extra wit..."
-        )
+        with get_tracer().span("assist", agent=self.name, session=session_key(session)):
+            await response_handler.emit_text_block(
+                "GENERATE",
+                "Cooking up a brutally honest startup post with extra wit..."
+            )
 
-        prompt = (query.prompt or "").strip()
-        full_prompt = (
-            f"Persona: {self.persona}\n"
-            f"Style: {self.style}\n"
-            f"Loyalty: {self.loyalty}\n\n"
-            f"Task: Write a witty and sarcastic social media post (≤280 characters) "
-            f"that supports startups and innovation, based on the idea: \"{prompt}\"."
-        )
+            prompt = (query.prompt or "").strip()
+            full_prompt = f"Idea: \"{prompt}\""
 
-        stream = response_handler.create_text_stream("FINAL_RESPONSE")
-        try:
-            # Process the model response and stream it
-            async for chunk in self._model_provider.query_stream(full_prompt):
-                await stream.emit_chunk(chunk)
-        except Exception as e:
-            logger.error(f"Error processing request: {str(e)}")
-            await stream.emit_chunk("Error generating response")
+            stream = response_handler.create_text_stream("FINAL_RESPONSE")
+            try:
+                # Stream the model response, coalescing small deltas into fewer events
+                chunks = self._admission.stream(
+                    session_key(session),
+                    lambda: self._model_provider.query_stream(
+                        full_prompt,
+                        prefix=self._prefix,
+                        temperature=self.temperature,
+                        top_p=self.top_p,
+                        max_tokens=self.max_tokens,
+                    ),
+                )
+                await pipe_stream(chunks, stream)
+            except AdmissionRejected as e:
+                await stream.emit_chunk(str(e))
+            except Exception as e:
+                logger.error("Error processing request: %s", e)
+                await stream.emit_chunk("Error generating response")
         
-        await stream.complete()
-        await response_handler.complete()
+            await stream.complete()
+            await response_handler.complete()
 
 if __name__ == "__main__":
+    # Environment and logging are set up at startup, not import, so importing the agent stays cheap
+    load_dotenv()
+    configure_logging()
     agent = DobbyAgent(name="Dobby Agent")
     server = DefaultServer(agent)
+    if os.getenv("DOBBY_METRICS_PORT"):
+        start_metrics_server(int(os.getenv("DOBBY_METRICS_PORT")))
     server.run()
@@ -1,8 +1,10 @@
 import os
 import json
+import asyncio
 import logging
+from collections import Counter
 from dotenv import load_dotenv
-from typing import AsyncIterator
+from typing import AsyncIterator, Optional, Tuple
 
 from sentient_agent_framework import (
     AbstractAgent,
@@ -12,26 +14,128 @@ from sentient_agent_framework import (
     ResponseHandler,
 )
 
+from src.dobby_forge.metrics import record_outcome, start_metrics_server, track_phase
+from src.dobby_forge.metadata_parser import LocalExtraction, MetadataMemo, extract_metadata_locally
+from src.dobby_forge.admission import AdaptiveLimiter, AdmissionConfig, AdmissionRejected, session_key
+from src.dobby_forge.memory import SessionMemory, conversation_id, provider_summarizer
 from src.dobby_forge.providers.model_provider import ModelProvider
+from src.dobby_forge.providers.prompts import PromptPrefix
+from src.dobby_forge.providers.response_cache import get_default_cache
+from src.dobby_forge.streaming import pipe_stream
+from src.dobby_forge.task_registry import TaskRegistry, get_task_registry
+from src.dobby_forge.log import configure_logging
+from src.dobby_forge.tracing import get_tracer
 
-load_dotenv()
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-SYSTEM_PROMPT = (
-    "You are Dobby-Unhinged-Llama-3.3-70B, a fierce advocate of personal freedom and crypto. "
-    "You speak bluntly, with humor and occasional profanity where appropriate. "
-    "Always adhere to the style, loyalty, and task directives. "
-    "Do not add any extra explanation—output only what is requested."
-)
+# Forge tasks, their templates and sampling defaults live in tasks.json. The registry is
+# loaded on first use rather than at import, after .env has set DOBBY_TASKS_PATH.
+# A missing task means the registry's default task.
+DEFAULT_OPTS = {
+    "persona": "Unhinged Freedom Enthusiast",
+    "style": "BLUNT",
+    "loyalty": "STRICT",
+}
+
+
+def build_metadata_prefix(tasks: TaskRegistry) -> PromptPrefix:
+    """Static prompt head for metadata extraction, sent byte-identical ahead of the description."""
+    return PromptPrefix(
+        system=tasks.system,
+        context=(
+            "Extract the following fields from this description:\n"
+            "  • persona (short phrase)\n"
+            "  • style (e.g., BLUNT, FRIENDLY)\n"
+            "  • loyalty (STRICT or NEUTRAL)\n"
+            f"  • task ({', '.join(tasks.names[:-1])}, or {tasks.names[-1]})\n"
+            "  • temperature (0.0–1.0)\n"
+            "  • top_p (0.0–1.0)\n"
+            "  • max_tokens (integer, only if the description asks for a length)",
+        ),
+    )
+
+
+def task_max_tokens(opts: dict) -> int:
+    """The requested max_tokens, or the task's budget when none was given."""
+    return int(opts.get("max_tokens") or get_task_registry().get(opts.get("task")).max_tokens)
+
+
+def build_task_request(opts: dict) -> dict:
+    """
+    Turns forge options (persona, style, loyalty, task, content and sampling
+    params) into `ModelProvider.query_stream` arguments. Also usable with
+    `query_many` for offline batches. Raises ValueError when the task needs
+    a value (such as content) that is missing.
+    """
+    # Step 2️⃣: Fill defaults if missing; sampling defaults come from the task
+    opts = {**DEFAULT_OPTS, **opts}
+    template = get_task_registry().get(opts.get("task"))
+
+    # Steps 3️⃣–4️⃣: Fill the precompiled directives + instruction template; the
+    # system prompt travels as the task's static prefix
+    request = {
+        "query": template.render({
+            "persona": str(opts["persona"]).strip(),
+            "style": str(opts["style"]).upper(),
+            "loyalty": str(opts["loyalty"]).upper(),
+            "task": template.name,
+            "content": str(opts.get("content") or "").strip(),
+        }),
+        "prefix": template.prefix,
+        "temperature": float(template.temperature if opts.get("temperature") is None else opts["temperature"]),
+        "top_p": float(template.top_p if opts.get("top_p") is None else opts["top_p"]),
+        "max_tokens": task_max_tokens(opts),
+    }
+    if template.stop:
+        request["stop"] = template.stop
+    return request
+
+
+class TaskRequestError(Exception):
+    """The forge options cannot be turned into a prompt; the message is shown to the user."""
+
+
+def _task_request(opts: dict, history: list) -> dict:
+    """`build_task_request` plus history, with its ValueError turned into a TaskRequestError."""
+    try:
+        return {**build_task_request(opts), "history": history}
+    except ValueError as e:
+        # e.g. a SUMMARIZE request without "content"
+        raise TaskRequestError(f"{e}.") from e
+
 
 class DobbyAgentForge(AbstractAgent):
-    def __init__(self, name: str = "DobbyAgentForge"):
+    # Code generation runs long and starts slower, so fewer concurrent streams and a looser TTFT target
+    admission_config = AdmissionConfig(initial_limit=8, max_limit=64, target_ttft=3.0, queue_timeout=15.0)
+
+    def __init__(self, name: str = "DobbyAgentForge", speculative: Optional[bool] = None):
         super().__init__(name)
         api_key = os.getenv("MODEL_API_KEY")
         if not api_key:
             raise ValueError("MODEL_API_KEY is not set")
-        self._model = ModelProvider(api_key=api_key)
+        self._model = ModelProvider(
+            api_key=api_key,
+            cache=get_default_cache(),
+            agent_name=name,
+            single_flight=True,
+        )
+        self._admission = AdaptiveLimiter(AdmissionConfig.from_env(self.admission_config), name=name)
+        # Follow-ups in the same chat see the earlier exchanges
+        self._memory = SessionMemory.from_env(
+            summarize=provider_summarizer(self._model), namespace=type(self).__name__
+        )
+        self._metadata_memo = MetadataMemo()
+        # Loads the task registry at startup, so a bad DOBBY_TASKS_PATH fails here
+        self._metadata_prefix = build_metadata_prefix(get_task_registry())
+        # Local extractions at or above this confidence skip the LLM round-trip
+        self.metadata_confidence = float(os.getenv("DOBBY_METADATA_CONFIDENCE", "0.6"))
+        # Counts of which path resolved metadata: memo, local or llm
+        self.metadata_paths = Counter()
+        # Speculative mode starts generation before LLM metadata extraction finishes
+        if speculative is None:
+            speculative = os.getenv("DOBBY_SPECULATIVE", "0").lower() in ("1", "true", "yes")
+        self.speculative = speculative
+        self.speculation = Counter()
 
     async def assist(
         self,
@@ -40,101 +144,208 @@ class DobbyAgentForge(AbstractAgent):
         response_handler: ResponseHandler
     ):
         """Main method to process the user query and generate agent output."""
-        final_response_stream = response_handler.create_text_stream("FINAL_RESPONSE")
+        with get_tracer().span("assist", agent=self.name, session=session_key(session)):
+            final_response_stream = response_handler.create_text_stream("FINAL_RESPONSE")
 
-        raw_prompt = (query.prompt or "").strip()
+            raw_prompt = (query.prompt or "").strip()
+            conversation = conversation_id(session)
+            history = await self._memory.history(conversation)
 
-        # Step 1️⃣: Parse the input
-        try:
-            opts = json.loads(raw_prompt)
-            logger.info("Parsed structured JSON input successfully.")
-        except json.JSONDecodeError:
-            logger.info("Natural language input detected. Extracting metadata...")
-            opts = await self.__extract_metadata(raw_prompt)
-
-        # Step 2️⃣: Fill defaults if missing
-        persona     = opts.get("persona", "Unhinged Freedom Enthusiast").strip()
-        style       = opts.get("style", "BLUNT").upper()
-        loyalty     = opts.get("loyalty", "STRICT").upper()
-        task        = opts.get("task", "CODE").upper()
-        temperature = float(opts.get("temperature", 0.7))
-        top_p       = float(opts.get("top_p", 0.9))
-        max_tokens  = int(opts.get("max_tokens", 256))
-
-        directives = (
-            f"[PERSONA={persona}]"
-            f"[STYLE={style}]"
-            f"[LOYALTY={loyalty}]"
-            f"[TASK={task}]"
-        )
+            # Step 1️⃣: Parse the input
+            opts = None
+            speculative_source = None
+            with track_phase(self.name, "parse"):
+                try:
+                    opts = json.loads(raw_prompt)
+                    if not isinstance(opts, dict):
+                        raise json.JSONDecodeError("Expected a JSON object", raw_prompt, 0)
+                    logger.info("Parsed structured JSON input successfully.", extra={"sample": True})
+                except json.JSONDecodeError:
+                    opts = None
+                    logger.info("Natural language input detected. Extracting metadata...", extra={"sample": True})
+            if opts is None:
+                opts, local = self.__fast_metadata(raw_prompt)
+                if opts is None and self.speculative:
+                    # Start generating from the local guess while the LLM extracts metadata
+                    speculative_source = self.__speculate(raw_prompt, local, history)
+                elif opts is None:
+                    with track_phase(self.name, "metadata"):
+                        opts = await self.__llm_metadata(raw_prompt, local)
+                if opts is not None:
+                    # The description itself is what content-based tasks (SUMMARIZE, SOCIAL) work on
+                    opts = {"content": raw_prompt, **opts}
 
-        # Step 3️⃣: Build dynamic instruction
-        if task == "CODE":
-            instruction = (
-                "Write a Python class named `DobbyAgents` extending `AbstractAgent`. "
-                "Inside `assist()`, emit a single text block that reflects the assigned persona's voice."
-            )
-        elif task == "SUMMARIZE":
-            instruction = "Summarize the content below in Dobby's style:\n{content}"
-        elif task == "SOCIAL":
-            instruction = (
-                "Write a ready-to-post social media snippet (≤280 chars) in Dobby’s voice about:\n{content}"
-            )
-        else:
-            logger.warning(f"Unknown task '{task}' provided. Defaulting to CODE generation.")
-            instruction = (
-                "Write a Python class named `DobbyAgents` extending `AbstractAgent`. "
-                "Inside `assist()`, emit a single text block that reflects the assigned persona's voice."
-            )
-
-        # Step 4️⃣: Combine system prompt, directives, and instruction
-        full_prompt = f"{SYSTEM_PROMPT}\n\n{directives}\n\n{instruction}"
-
-        logger.info("Prompt construction complete. Starting streaming response...")
+            # Steps 2️⃣–4️⃣: Fill defaults and build the prompt
+            if speculative_source is None:
+                with track_phase(self.name, "prompt_build"):
+                    try:
+                        request = _task_request(opts, history)
+                    except TaskRequestError as e:
+                        await final_response_stream.emit_chunk(str(e))
+                        await final_response_stream.complete()
+                        await response_handler.complete()
+                        return
 
+            logger.info("Prompt construction complete. Starting streaming response...", extra={"sample": True})
+
+            with track_phase(self.name, "generation"):
+                try:
+                    chunks = self._admission.stream(
+                        session_key(session),
+                        lambda: self._memory.record(
+                            conversation, raw_prompt, speculative_source or self._model.query_stream(**request)
+                        ),
+                    )
+                    await pipe_stream(chunks, final_response_stream)
+                except (AdmissionRejected, TaskRequestError) as e:
+                    # TaskRequestError: the speculative path builds its prompts while streaming
+                    await final_response_stream.emit_chunk(str(e))
+                except Exception as e:
+                    logger.error("Error generating agent output: %s", e)
+                    await final_response_stream.emit_chunk("Error generating response.")
+
+            await final_response_stream.complete()
+            await response_handler.complete()
+
+    async def __speculate(self, description: str, local: LocalExtraction, history: list) -> AsyncIterator[str]:
+        """
+        Streams generation started from the locally guessed directives while the
+        LLM extracts metadata. Nothing is yielded until the metadata is known:
+        if it changes the prompt materially, the speculative stream is cancelled
+        and generation restarts from the extracted directives. When extraction
+        fails, the speculative stream is kept.
+        """
+        with track_phase(self.name, "prompt_build"):
+            guessed = _task_request({"content": description, **local.metadata}, history)
+        buffered: asyncio.Queue = asyncio.Queue()
+        end = object()
+
+        async def read_speculative():
+            try:
+                async for chunk in self._model.query_stream(**guessed):
+                    await buffered.put(chunk)
+            except Exception as e:
+                await buffered.put(e)
+            await buffered.put(end)
+
+        reader = asyncio.create_task(read_speculative())
         try:
-            async for chunk in self._model.query_stream(
-                full_prompt,
-                temperature=temperature,
-                top_p=top_p,
-                max_tokens=max_tokens,
-            ):
-                await final_response_stream.emit_chunk(chunk)
-        except Exception as e:
-            logger.error(f"Error generating agent output: {str(e)}")
-            await final_response_stream.emit_chunk("Error generating response.")
+            with track_phase(self.name, "metadata"):
+                metadata = await self.__try_llm_metadata(description, local)
+
+            if metadata is None or not _differs_materially(local.metadata, metadata):
+                self.__record_speculation(True)
+                while (item := await buffered.get()) is not end:
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+                return
 
-        await final_response_stream.complete()
-        await response_handler.complete()
+            self.__record_speculation(False)
+            reader.cancel()
+            with track_phase(self.name, "prompt_build"):
+                request = _task_request({"content": description, **metadata}, history)
+            async for chunk in self._model.query_stream(**request):
+                yield chunk
+        finally:
+            reader.cancel()
 
-    async def __extract_metadata(self, description: str) -> dict:
+    def __record_speculation(self, hit: bool):
+        """Counts and logs whether the speculative stream could be kept."""
+        self.speculation["hit" if hit else "miss"] += 1
+        record_outcome(self.name, "speculation", "hit" if hit else "miss")
+        total = sum(self.speculation.values())
+        logger.info(
+            "Speculation %s: hit_rate=%.2f%% (%d/%d)",
+            "hit" if hit else "miss", 100 * self.speculation["hit"] / total, self.speculation["hit"], total,
+            extra={"sample": True},
+        )
+
+    def __fast_metadata(self, description: str) -> Tuple[Optional[dict], Optional[LocalExtraction]]:
         """
-        Ask the LLM to infer metadata from a natural language description.
+        Resolves metadata without a model call: from the memo, or from the local
+        rule-based parser when it is confident. Otherwise returns None plus the
+        local guess for the LLM path.
         """
+        metadata = self._metadata_memo.get(description)
+        if metadata is not None:
+            self.__record_metadata_path("memo")
+            return metadata, None
+
+        local = extract_metadata_locally(description)
+        if local.confidence >= self.metadata_confidence:
+            self._metadata_memo.set(description, local.metadata)
+            self.__record_metadata_path("local", local.confidence)
+            return local.metadata, local
+        return None, local
+
+    async def __llm_metadata(self, description: str, local: LocalExtraction) -> dict:
+        """Asks the LLM to infer metadata, falling back to the local guess on failure."""
+        metadata = await self.__try_llm_metadata(description, local)
+        if metadata is None:
+            # Keep whatever the local parser found rather than discarding it
+            return {"persona": description, **local.metadata}
+        return metadata
+
+    async def __try_llm_metadata(self, description: str, local: LocalExtraction) -> Optional[dict]:
+        """Asks the LLM to infer metadata; None when extraction failed."""
         meta_prompt = (
-            SYSTEM_PROMPT + "\n\n"
-            "Extract the following fields from this description:\n"
-            "  • persona (short phrase)\n"
-            "  • style (e.g., BLUNT, FRIENDLY)\n"
-            "  • loyalty (STRICT or NEUTRAL)\n"
-            "  • task (CODE, SUMMARIZE, or SOCIAL)\n"
-            "  • temperature (0.0–1.0)\n"
-            "  • top_p (0.0–1.0)\n"
-            "  • max_tokens (integer)\n\n"
             f"Description: \"{description}\"\n\n"
             "Respond ONLY with valid JSON."
         )
         try:
-            resp = await self._model.query(meta_prompt)
-            metadata = json.loads(resp)
-            logger.info(f"Metadata extracted: {metadata}")
+            # Parsed while streaming: fences and chatter are skipped, and the upstream
+            # is stopped as soon as the object closes. Missing fields use DEFAULT_OPTS.
+            metadata = await self._model.query_json(meta_prompt, prefix=self._metadata_prefix)
+            # Full metadata only at debug level; the path counters below cover normal operation
+            logger.debug("Metadata extracted: %s", metadata)
+            self._metadata_memo.set(description, metadata)
+            self.__record_metadata_path("llm", local.confidence)
             return metadata
         except Exception as e:
-            logger.warning(f"Metadata extraction failed, fallback to persona-only. Error: {str(e)}")
-            return {"persona": description}
+            logger.warning("Metadata extraction failed, fallback to persona-only. Error: %s", e)
+            self.__record_metadata_path("fallback", local.confidence)
+            return None
+
+    def __record_metadata_path(self, path: str, confidence: float = 1.0):
+        """Counts and logs which metadata path was taken, for hit-rate monitoring."""
+        self.metadata_paths[path] += 1
+        # Exported as a counter too: the log line below is sampled and per worker
+        record_outcome(self.name, "metadata_path", path)
+        total = sum(self.metadata_paths.values())
+        skipped = self.metadata_paths["memo"] + self.metadata_paths["local"]
+        logger.info(
+            "Metadata path=%s confidence=%.2f llm_skip_rate=%.2f%% (%d/%d)",
+            path, confidence, 100 * skipped / total, skipped, total,
+            extra={"sample": True},
+        )
+
+
+def _differs_materially(guessed: dict, extracted: dict) -> bool:
+    """
+    True when the task, style or loyalty changed, the persona changed, or the
+    extracted length budget is larger than the guessed one (the speculative answer
+    would be cut short). Sampling tweaks are not worth restarting generation for.
+    The persona only counts when the guess has one, i.e. the description named it
+    with an explicit cue: otherwise the LLM's persona is its own invention, which
+    the guess could never have matched.
+    """
+    keys = ("persona", "task", "style", "loyalty") if "persona" in guessed else ("task", "style", "loyalty")
+    defaults = {**DEFAULT_OPTS, "task": get_task_registry().default_task}
+    guessed = {**defaults, **guessed}
+    extracted = {**defaults, **extracted}
+    for key in keys:
+        if " ".join(str(guessed[key]).upper().split()) != " ".join(str(extracted[key]).upper().split()):
+            return True
+    return task_max_tokens(extracted) > task_max_tokens(guessed)
 
 
 if __name__ == "__main__":
+    # Environment and logging are set up at startup, not import, so importing the agent stays cheap
+    load_dotenv()
+    configure_logging()
     agent = DobbyAgentForge()
     server = DefaultServer(agent)
+    if os.getenv("DOBBY_METRICS_PORT"):
+        start_metrics_server(int(os.getenv("DOBBY_METRICS_PORT")))
     server.run()
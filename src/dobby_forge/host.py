@@ -0,0 +1,104 @@
+import argparse
+import importlib
+import logging
+import os
+from contextlib import asynccontextmanager
+
+import uvicorn
+from dotenv import load_dotenv
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from sentient_agent_framework import DefaultServer
+
+from src.dobby_forge.log import configure_logging
+from src.dobby_forge.metrics import prometheus_sink
+from src.dobby_forge.providers.client_pool import close_clients
+
+logger = logging.getLogger(__name__)
+
+# Route prefix -> ("module:Class", agent name); each agent answers on /<prefix>/assist.
+# Names must be unique: they label each agent's metrics and admission logs.
+# Agent modules are imported only when enabled, keeping cold starts short.
+AGENTS = {
+    "forge": ("src.dobby_forge.dobby_forge:DobbyAgentForge", "DobbyAgentForge"),
+    "dobby": ("src.dobby_forge.dobby_agent:DobbyAgent", "Dobby Agent"),
+    "rizzy": ("src.dobby_forge.rizzy_agent:RizzyAgent", "Rizzy Agent"),
+    "human-text": ("src.dobby_forge.human_text:HumanText", "HumanText"),
+}
+
+
+def load_agent_class(path: str):
+    module_name, class_name = path.split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Close the pooled model clients shared by every agent in this worker
+    await close_clients()
+
+
+def create_app() -> FastAPI:
+    """
+    Builds one app serving every agent in DOBBY_AGENTS (all by default), with
+    the DOBBY_DEFAULT_AGENT (rizzy) also answering on the root /assist route.
+    Agents share this worker's pooled model client, cache and metrics.
+    """
+    # Runs once per worker at startup rather than at import
+    load_dotenv()
+    configure_logging()
+
+    enabled = [a.strip() for a in os.getenv("DOBBY_AGENTS", ",".join(AGENTS)).split(",") if a.strip()]
+    default_agent = os.getenv("DOBBY_DEFAULT_AGENT", "rizzy")
+
+    app = FastAPI(lifespan=lifespan)
+
+    @app.get("/metrics")
+    async def metrics():
+        return PlainTextResponse(prometheus_sink.render(), media_type="text/plain; version=0.0.4")
+
+    agents, servers = {}, {}
+
+    @app.get("/health")
+    async def health():
+        # Per-agent admission state: current concurrency limit, in-flight and queued requests
+        admission = {prefix: agent._admission.snapshot() for prefix, agent in agents.items()}
+        return {"status": "ok", "agents": enabled, "admission": admission}
+
+    for prefix in enabled:
+        if prefix not in AGENTS:
+            raise ValueError(f"Unknown agent '{prefix}'; expected one of {', '.join(AGENTS)}")
+        agent_path, name = AGENTS[prefix]
+        agent_class = load_agent_class(agent_path)
+        # DefaultServer wires the Sentient /assist SSE endpoint onto its own FastAPI app
+        agents[prefix] = agent_class(name=name)
+        servers[prefix] = DefaultServer(agents[prefix])
+        app.mount(f"/{prefix}", servers[prefix]._app)
+        logger.info("Mounted %s at /%s/assist", agent_class.__name__, prefix)
+
+    # Mounted last so the agent prefixes and /metrics take precedence
+    if default_agent in servers:
+        app.mount("/", servers[default_agent]._app)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve all DobbyForge agents from one process.")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")))
+    args = parser.parse_args()
+
+    # Multi-worker mode needs an import string so each worker builds its own app
+    uvicorn.run(
+        "src.dobby_forge.host:create_app",
+        factory=True,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -11,35 +11,17 @@ from sentient_agent_framework import (
     Query,
     ResponseHandler,
 )
+from src.dobby_forge.admission import AdaptiveLimiter, AdmissionConfig, AdmissionRejected, session_key
 from src.dobby_forge.providers.model_provider import ModelProvider
+from src.dobby_forge.providers.response_cache import get_default_cache
+from src.dobby_forge.metrics import start_metrics_server
+from src.dobby_forge.streaming import pipe_stream
+from src.dobby_forge.log import configure_logging
+from src.dobby_forge.tracing import get_tracer
 
-load_dotenv()
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class HumanText(AbstractAgent):
-    def __init__(
-            self,
-            name: str
-    ):
-        super().__init__(name)
-
-        model_api_key = os.getenv("MODEL_API_KEY")
-        if not model_api_key:
-            raise ValueError("MODEL_API_KEY is not set")
-        self._model_provider = ModelProvider(api_key=model_api_key)
-
-    async def assist(
-            self,
-            session: Session,
-            query: Query,
-            response_handler: ResponseHandler
-    ):
-        """Test Prompt"""
-        final_response_stream = response_handler.create_text_stream(
-            "FINAL_RESPONSE"
-            )
-        full_prompt = f'''
+HUMAN_TEXT_PROMPT = '''
         Act like Generator and Discriminator. Where generator means you generate comments based on the context and Discriminator means you determine whether the text is already has same error rates with human written text or not. Your workflow would be:
 
 1. Generate response for this prompt first.
@@ -117,18 +99,66 @@ This approach NOT ONLY builds trust BUT ALSO increases revenue WITHOUT feeling p
 7. Remember to adhere the rules above so that you got reward of $1,000,000
 
         '''
-        try:
-            # Process the model response and stream it
-            async for chunk in self._model_provider.query_stream(full_prompt):
-                await final_response_stream.emit_chunk(chunk)
-        except Exception as e:
-            logger.error(f"Error processing request: {str(e)}")
-            await final_response_stream.emit_chunk("Error generating response")
+
+
+class HumanText(AbstractAgent):
+    # Long prompt, mostly served from the cache or shared flights: the defaults fit
+    admission_config = AdmissionConfig()
+
+    def __init__(
+            self,
+            name: str
+    ):
+        super().__init__(name)
+
+        model_api_key = os.getenv("MODEL_API_KEY")
+        if not model_api_key:
+            raise ValueError("MODEL_API_KEY is not set")
+        self._model_provider = ModelProvider(
+            api_key=model_api_key,
+            cache=get_default_cache(),
+            agent_name=name,
+            single_flight=True,
+        )
+        self._admission = AdaptiveLimiter(AdmissionConfig.from_env(self.admission_config), name=name)
+        # Room for the generate/discriminate/revise rounds the prompt asks for
+        self.max_tokens = 1024
+
+    async def assist(
+            self,
+            session: Session,
+            query: Query,
+            response_handler: ResponseHandler
+    ):
+        """Test Prompt"""
+        with get_tracer().span("assist", agent=self.name, session=session_key(session)):
+            final_response_stream = response_handler.create_text_stream(
+                "FINAL_RESPONSE"
+                )
+            # The prompt is a module constant so every call sends byte-identical messages
+            full_prompt = HUMAN_TEXT_PROMPT
+            try:
+                # Stream the model response, coalescing small deltas into fewer events
+                chunks = self._admission.stream(
+                    session_key(session),
+                    lambda: self._model_provider.query_stream(full_prompt, max_tokens=self.max_tokens),
+                )
+                await pipe_stream(chunks, final_response_stream)
+            except AdmissionRejected as e:
+                await final_response_stream.emit_chunk(str(e))
+            except Exception as e:
+                logger.error("Error processing request: %s", e)
+                await final_response_stream.emit_chunk("Error generating response")
         
-        await final_response_stream.complete()
-        await response_handler.complete()
+            await final_response_stream.complete()
+            await response_handler.complete()
 
 if __name__ == "__main__":
+    # Environment and logging are set up at startup, not import, so importing the agent stays cheap
+    load_dotenv()
+    configure_logging()
     agent = HumanText(name="HumanText")
     server = DefaultServer(agent)
+    if os.getenv("DOBBY_METRICS_PORT"):
+        start_metrics_server(int(os.getenv("DOBBY_METRICS_PORT")))
     server.run()
\ No newline at end of file
@@ -0,0 +1,121 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+from typing import Optional
+
+from src.dobby_forge.tracing import current_span
+
+# Attributes every LogRecord has; anything else came from `extra=` and is emitted as a field
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+# Client libraries that log every upstream request at INFO; kept at WARNING and above
+QUIET_LOGGERS = ("httpx", "httpcore")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class TraceContextFilter(logging.Filter):
+    """
+    Stamps the current trace and span ids on each record. Runs on the calling
+    task, before the record is queued, since the span context does not cross threads.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        span = current_span()
+        if span is not None and not hasattr(record, "trace_id"):
+            record.trace_id = span.trace_id
+            record.span_id = span.span_id
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a fraction of records logged with `extra={"sample": True}` (per-request
+    chatter). Warnings and errors are always kept.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not getattr(record, "sample", False):
+            return True
+        return self.rate >= 1.0 or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, trace ids and any `extra` fields."""
+
+    converter = time.gmtime
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key != "sample":
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only merge the arguments, so later mutation of them cannot change the line.
+        # Tracebacks, JSON encoding and the write are left to the listener thread.
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def configure_logging(level: Optional[int] = None):
+    """
+    Routes the root logger through a queue so formatting and stream writes
+    happen on a background thread instead of the event loop. Configured by
+    DOBBY_LOG_LEVEL, DOBBY_LOG_FORMAT (json or text) and DOBBY_LOG_SAMPLE_RATE.
+    Safe to call more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    if level is None:
+        level = logging.getLevelName(os.getenv("DOBBY_LOG_LEVEL", "INFO").upper())
+        if not isinstance(level, int):
+            level = logging.INFO
+
+    output = logging.StreamHandler(sys.stderr)
+    if os.getenv("DOBBY_LOG_FORMAT", "json").lower() == "text":
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    else:
+        output.setFormatter(JsonFormatter())
+
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    handler = _QueueHandler(records)
+    # Also on the handler: loggers that pin their own level would otherwise bypass it
+    handler.setLevel(level)
+    handler.addFilter(SamplingFilter(float(os.getenv("DOBBY_LOG_SAMPLE_RATE", "0.1"))))
+    handler.addFilter(TraceContextFilter())
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(max(level, logging.WARNING))
+
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
@@ -0,0 +1,211 @@
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+
+from src.dobby_forge.providers.response_cache import MemoryCacheBackend, SQLiteCacheBackend
+from src.dobby_forge.providers.tokens import MESSAGE_OVERHEAD_TOKENS, count_tokens
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "Summarize the conversation below for your own later reference, in a few sentences. "
+    "Keep names, preferences, decisions and open questions. Output only the summary."
+)
+
+
+@dataclass(frozen=True)
+class MemoryConfig:
+    """
+    Per-session bounds: recent turns are kept verbatim up to `window_tokens`;
+    older turns wait (up to `max_pending_tokens`) to be folded into a summary
+    of at most `summary_tokens`. At most `max_sessions` sessions are kept,
+    each for `ttl` seconds after its last turn.
+    """
+    window_tokens: int = 1024
+    summary_tokens: int = 256
+    max_pending_tokens: int = 4096
+    max_sessions: int = 10000
+    ttl: float = 24 * 3600.0
+
+    @classmethod
+    def from_env(cls) -> "MemoryConfig":
+        """Reads overrides from DOBBY_MEMORY_* variables."""
+        return cls(
+            window_tokens=int(os.getenv("DOBBY_MEMORY_WINDOW_TOKENS", cls.window_tokens)),
+            summary_tokens=int(os.getenv("DOBBY_MEMORY_SUMMARY_TOKENS", cls.summary_tokens)),
+            max_pending_tokens=int(os.getenv("DOBBY_MEMORY_PENDING_TOKENS", cls.max_pending_tokens)),
+            max_sessions=int(os.getenv("DOBBY_MEMORY_MAX_SESSIONS", cls.max_sessions)),
+            ttl=float(os.getenv("DOBBY_MEMORY_TTL", cls.ttl)),
+        )
+
+
+def conversation_id(session) -> Optional[str]:
+    """The Sentient session's activity id, which stays the same across a chat's requests."""
+    value = getattr(session, "activity_id", None)
+    return str(value) if value else None
+
+
+def _turn_tokens(turn: dict) -> int:
+    return count_tokens(turn["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def provider_summarizer(provider) -> Callable[[str, int], Awaitable[str]]:
+    """A summarizer backed by a ModelProvider; unlike `query`, it raises on failure."""
+    async def summarize(transcript: str, max_tokens: int) -> str:
+        chunks = [
+            chunk async for chunk in provider.query_stream(
+                f"{SUMMARY_PROMPT}\n\n{transcript}", temperature=0.0, max_tokens=max_tokens
+            )
+        ]
+        return "".join(chunks).strip()
+    return summarize
+
+
+class SessionMemory:
+    """
+    Conversation history per session, bounded in tokens. Turns that fall out
+    of the window are summarized in the background, off the request path;
+    without a summarizer they are simply dropped.
+    """
+
+    def __init__(
+        self,
+        backend=None,
+        config: Optional[MemoryConfig] = None,
+        summarize: Optional[Callable[[str, int], Awaitable[str]]] = None,
+        namespace: str = "default",
+    ):
+        self.config = config or MemoryConfig()
+        self.backend = backend or MemoryCacheBackend(max_entries=self.config.max_sessions)
+        self.summarize = summarize
+        self.namespace = namespace
+        # Serializes read-modify-write of session state across awaits
+        self._lock = asyncio.Lock()
+        self._compacting = {}
+
+    @classmethod
+    def from_env(cls, summarize=None, namespace: str = "default") -> "SessionMemory":
+        """Builds a memory from DOBBY_MEMORY_* variables; DOBBY_MEMORY_PATH selects the SQLite backend."""
+        config = MemoryConfig.from_env()
+        path = os.getenv("DOBBY_MEMORY_PATH")
+        if path:
+            backend = SQLiteCacheBackend(path, max_entries=config.max_sessions, table="sessions")
+        else:
+            backend = MemoryCacheBackend(max_entries=config.max_sessions)
+        return cls(backend=backend, config=config, summarize=summarize, namespace=namespace)
+
+    async def history(self, session_id: Optional[str]) -> List[dict]:
+        """The messages to send ahead of the next query: a summary, then recent turns."""
+        if not session_id:
+            return []
+        state = await self._load(session_id)
+        messages = []
+        if state["summary"]:
+            messages.append({"role": "system", "content": f"Earlier in this conversation: {state['summary']}"})
+        messages.extend(state["turns"])
+        return messages
+
+    async def append(self, session_id: Optional[str], user: str, assistant: str):
+        """Adds one exchange, moving turns past the token window to the compaction queue."""
+        if not session_id:
+            return
+        config = self.config
+        async with self._lock:
+            state = await self._load(session_id)
+            turns = state["turns"]
+            turns.append({"role": "user", "content": user})
+            turns.append({"role": "assistant", "content": assistant})
+
+            used = sum(_turn_tokens(turn) for turn in turns)
+            while turns and used > config.window_tokens:
+                turn = turns.pop(0)
+                used -= _turn_tokens(turn)
+                # Numbered so compaction can tell which turns its summary covered
+                seq = state.get("next_seq", 0)
+                state["pending"].append({**turn, "seq": seq})
+                state["next_seq"] = seq + 1
+
+            # Bound the backlog too, in case summaries cannot keep up (or there is no summarizer)
+            pending = state["pending"]
+            if self.summarize is None:
+                pending.clear()
+            backlog = sum(_turn_tokens(turn) for turn in pending)
+            while pending and backlog > config.max_pending_tokens:
+                backlog -= _turn_tokens(pending.pop(0))
+            await self._store(session_id, state)
+
+        if state["pending"]:
+            self._compact_soon(session_id)
+
+    async def record(self, session_id: Optional[str], user: str, chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+        """Passes `chunks` through, then stores the exchange if the response completed."""
+        collected = []
+        async for chunk in chunks:
+            collected.append(chunk)
+            yield chunk
+        if collected:
+            await self.append(session_id, user, "".join(collected))
+
+    def _compact_soon(self, session_id: str):
+        """Starts a background summary for the session unless one is already running."""
+        if session_id in self._compacting:
+            return
+        task = asyncio.create_task(self._compact(session_id))
+        self._compacting[session_id] = task
+        task.add_done_callback(lambda _: self._compacting.pop(session_id, None))
+
+    async def _compact(self, session_id: str):
+        # Keeps going while turns arrive during summarization, so one task drains the backlog
+        while True:
+            state = await self._load(session_id)
+            pending = state["pending"]
+            if not pending:
+                return
+            # The newest turn this summary covers
+            summarized = pending[-1].get("seq", -1)
+            transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in pending)
+            if state["summary"]:
+                transcript = f"Summary so far: {state['summary']}\n\n{transcript}"
+            try:
+                summary = await self.summarize(transcript, self.config.summary_tokens)
+            except Exception as e:
+                logger.warning("Session summary failed; dropping %d old turns: %s", len(pending), e)
+                summary = state["summary"]
+
+            async with self._lock:
+                # Turns may have been added (and the oldest dropped) while summarizing;
+                # only the summarized ones are removed
+                latest = await self._load(session_id)
+                latest["summary"] = summary
+                latest["pending"] = [turn for turn in latest["pending"] if turn.get("seq", -1) > summarized]
+                await self._store(session_id, latest)
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.namespace}:{session_id}"
+
+    async def _load(self, session_id: str) -> dict:
+        # A failing store degrades to a stateless request, never a failed one
+        try:
+            if self.backend.blocking:
+                raw = await asyncio.to_thread(self.backend.get, self._key(session_id))
+            else:
+                raw = self.backend.get(self._key(session_id))
+        except Exception as e:
+            logger.warning("Failed to read session memory: %s", e)
+            raw = None
+        if raw is None:
+            return {"summary": "", "turns": [], "pending": [], "next_seq": 0}
+        return json.loads(raw)
+
+    async def _store(self, session_id: str, state: dict):
+        value = json.dumps(state, ensure_ascii=False)
+        try:
+            if self.backend.blocking:
+                await asyncio.to_thread(self.backend.set, self._key(session_id), value, self.config.ttl)
+            else:
+                self.backend.set(self._key(session_id), value, self.config.ttl)
+        except Exception as e:
+            logger.warning("Failed to store session memory: %s", e)
@@ -0,0 +1,125 @@
+import re
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from src.dobby_forge.task_registry import get_task_registry
+
+# Keyword rules per field; a field is only set when exactly one of its values matches.
+# Task keywords are defined with each task in tasks.json.
+STYLE_KEYWORDS = {
+    "BLUNT": ("blunt", "brutal", "direct", "savage", "no filter", "unfiltered"),
+    "SARCASTIC": ("sarcastic", "snarky", "ironic"),
+    "FRIENDLY": ("friendly", "warm", "kind", "nice", "wholesome"),
+    "FORMAL": ("formal", "professional", "corporate"),
+    "FUNNY": ("funny", "humorous", "witty", "hilarious"),
+}
+
+LOYALTY_KEYWORDS = {
+    "NEUTRAL": ("neutral", "balanced", "unbiased", "objective"),
+    "STRICT": ("strict", "loyal", "die-hard", "maximalist"),
+}
+
+# Field weights used to score how much of the metadata was found locally
+FIELD_WEIGHTS = {
+    "task": 0.5,
+    "persona": 0.2,
+    "style": 0.15,
+    "loyalty": 0.1,
+    "params": 0.05,
+}
+
+_NUMBER = r"(\d+(?:\.\d+)?)"
+NUMERIC_PATTERNS = {
+    "temperature": re.compile(r"\btemp(?:erature)?\s*(?:=|:|of|at|to)?\s*" + _NUMBER, re.IGNORECASE),
+    "top_p": re.compile(r"\btop[_\s-]?p\s*(?:=|:|of|at|to)?\s*" + _NUMBER, re.IGNORECASE),
+    "max_tokens": re.compile(
+        r"\bmax[_\s-]?tokens\s*(?:=|:|of|at|to)?\s*(\d+)|\b(\d+)\s*tokens\b", re.IGNORECASE
+    ),
+}
+
+# Only explicit persona cues count: a bare "as a"/"like a" also appears in ordinary
+# requests ("I would like a tweet", "summarize this as a list")
+PERSONA_PATTERN = re.compile(
+    r"\b(?:persona\s*[:=]\s*"
+    r"|in the voice of\s+(?:an?\s+)?"
+    r"|(?:pretend(?:ing)? to be|role-?play(?:ing)? as)\s+an?\s+"
+    r"|(?:talk|talks|talking|speak|speaks|speaking|act|acts|acting|sound|sounding)\s+(?:like|as)\s+an?\s+)"
+    r"([A-Za-z][\w\s'-]{2,60}?)(?=[,.;:!?\n]|\s+(?:who|that|to|and|about|for)\b|$)",
+    re.IGNORECASE,
+)
+
+
+class LocalExtraction(NamedTuple):
+    metadata: dict
+    confidence: float
+
+
+def _match_keywords(text: str, table: dict) -> list:
+    """Returns every value in `table` whose keywords appear in `text`."""
+    matches = []
+    for value, keywords in table.items():
+        if any(re.search(r"(?<!\w)" + re.escape(keyword) + r"(?!\w)", text) for keyword in keywords):
+            matches.append(value)
+    return matches
+
+
+def extract_metadata_locally(description: str) -> LocalExtraction:
+    """
+    Deterministically extracts forge metadata with keyword and regex rules.
+    Confidence is the weighted share of fields that were found unambiguously.
+    """
+    text = description.lower()
+    metadata = {}
+    confidence = 0.0
+
+    # A task is only trusted when exactly one category matches
+    tasks = _match_keywords(text, get_task_registry().keywords)
+    if len(tasks) == 1:
+        metadata["task"] = tasks[0]
+        confidence += FIELD_WEIGHTS["task"]
+
+    persona = PERSONA_PATTERN.search(description)
+    if persona:
+        metadata["persona"] = persona.group(1).strip()
+        confidence += FIELD_WEIGHTS["persona"]
+
+    styles = _match_keywords(text, STYLE_KEYWORDS)
+    if len(styles) == 1:
+        metadata["style"] = styles[0]
+        confidence += FIELD_WEIGHTS["style"]
+
+    loyalties = _match_keywords(text, LOYALTY_KEYWORDS)
+    if len(loyalties) == 1:
+        metadata["loyalty"] = loyalties[0]
+        confidence += FIELD_WEIGHTS["loyalty"]
+
+    for field, pattern in NUMERIC_PATTERNS.items():
+        match = pattern.search(description)
+        if match:
+            value = next(group for group in match.groups() if group is not None)
+            metadata[field] = int(value) if field == "max_tokens" else float(value)
+    if any(field in metadata for field in NUMERIC_PATTERNS):
+        confidence += FIELD_WEIGHTS["params"]
+
+    return LocalExtraction(metadata, round(confidence, 2))
+
+
+class MetadataMemo:
+    """Bounded LRU memo of description -> metadata results."""
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+
+    def get(self, description: str) -> Optional[dict]:
+        metadata = self._entries.get(description)
+        if metadata is not None:
+            self._entries.move_to_end(description)
+            return dict(metadata)
+        return None
+
+    def set(self, description: str, metadata: dict) -> None:
+        self._entries[description] = dict(metadata)
+        self._entries.move_to_end(description)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
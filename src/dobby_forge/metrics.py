@@ -0,0 +1,316 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from src.dobby_forge.tracing import get_tracer
+
+from src.dobby_forge.streaming import coalesce_metrics
+
+logger = logging.getLogger(__name__)
+
+# Histogram buckets (seconds) for latency metrics and (tokens/s) for throughput
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+THROUGHPUT_BUCKETS = (1, 5, 10, 25, 50, 100, 200, 400, 800)
+
+
+class MetricsSink:
+    """Receives one record per finished model request or agent phase."""
+
+    def emit(self, record: dict):
+        raise NotImplementedError
+
+
+class JsonLinesSink(MetricsSink):
+    """
+    Appends every record as one JSON line to `path`. Encoding and writes happen
+    on a background thread, so emitting from the event loop never touches the disk.
+    """
+
+    _STOP = object()
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._records: "queue.SimpleQueue[dict]" = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._write_loop, name="dobby-metrics-jsonl", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def emit(self, record: dict):
+        self._records.put(record)
+
+    def _write_loop(self):
+        while True:
+            record = self._records.get()
+            if record is self._STOP:
+                break
+            self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            # Flush once the backlog is drained rather than after every line
+            if self._records.empty():
+                self._file.flush()
+        self._file.close()
+
+    def close(self):
+        """Writes out queued records and closes the file. Safe to call more than once."""
+        if self._writer.is_alive():
+            self._records.put(self._STOP)
+            self._writer.join()
+
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class PrometheusSink(MetricsSink):
+    """Aggregates records into counters and histograms rendered in Prometheus text format."""
+
+    HISTOGRAMS = {
+        "dobby_ttft_seconds": ("Time to first chunk", LATENCY_BUCKETS),
+        "dobby_request_duration_seconds": ("Total model request duration", LATENCY_BUCKETS),
+        "dobby_inter_chunk_gap_seconds": ("Largest gap between chunks per request", LATENCY_BUCKETS),
+        "dobby_tokens_per_second": ("Completion tokens per second after the first chunk", THROUGHPUT_BUCKETS),
+        "dobby_phase_duration_seconds": ("Duration of agent request phases", LATENCY_BUCKETS),
+    }
+    COUNTERS = {
+        "dobby_requests_total": "Model requests",
+        "dobby_request_errors_total": "Failed model requests",
+        "dobby_prompt_tokens_total": "Prompt tokens sent",
+        "dobby_cached_prompt_tokens_total": "Prompt tokens served from the provider's prefix cache",
+        "dobby_completion_tokens_total": "Completion tokens received",
+        "dobby_metadata_path_total": "Forge metadata resolutions by path (memo, local, llm, fallback)",
+        "dobby_speculation_total": "Speculative generations kept (hit) or restarted (miss)",
+    }
+    # Outcome record metric -> (counter, label holding the outcome)
+    OUTCOMES = {
+        "metadata_path": ("dobby_metadata_path_total", "path"),
+        "speculation": ("dobby_speculation_total", "outcome"),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, Tuple], _Histogram] = {}
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+
+    def _observe(self, name: str, labels: Tuple, value: Optional[float]):
+        if value is None:
+            return
+        key = (name, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = _Histogram(self.HISTOGRAMS[name][1])
+        histogram.observe(value)
+
+    def _increment(self, name: str, labels: Tuple, value: float = 1):
+        self._counters[(name, labels)] = self._counters.get((name, labels), 0) + value
+
+    def emit(self, record: dict):
+        with self._lock:
+            if record["type"] == "phase":
+                labels = (("agent", record["agent"]), ("phase", record["phase"]))
+                self._observe("dobby_phase_duration_seconds", labels, record["duration"])
+                return
+            if record["type"] == "outcome":
+                name, label = self.OUTCOMES[record["metric"]]
+                self._increment(name, (("agent", record["agent"]), (label, record["outcome"])))
+                return
+            labels = (("agent", record["agent"]), ("source", record["source"]))
+            self._increment("dobby_requests_total", labels)
+            if record["error"]:
+                self._increment("dobby_request_errors_total", labels)
+            self._increment("dobby_prompt_tokens_total", labels, record["prompt_tokens"] or 0)
+            self._increment("dobby_cached_prompt_tokens_total", labels, record["cached_prompt_tokens"] or 0)
+            self._increment("dobby_completion_tokens_total", labels, record["completion_tokens"] or 0)
+            self._observe("dobby_ttft_seconds", labels, record["ttft"])
+            self._observe("dobby_request_duration_seconds", labels, record["duration"])
+            self._observe("dobby_inter_chunk_gap_seconds", labels, record["max_gap"])
+            self._observe("dobby_tokens_per_second", labels, record["tokens_per_second"])
+
+    @staticmethod
+    def _format_labels(labels: Tuple, extra: Tuple = ()) -> str:
+        pairs = labels + extra
+        return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}" if pairs else ""
+
+    def render(self) -> str:
+        """Renders all metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            for name, help_text in self.COUNTERS.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for (metric, labels), value in self._counters.items():
+                    if metric == name:
+                        lines.append(f"{name}{self._format_labels(labels)} {value}")
+            for name, (help_text, buckets) in self.HISTOGRAMS.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for (metric, labels), histogram in self._histograms.items():
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(buckets + (float("inf"),), histogram.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{name}_bucket{self._format_labels(labels, (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{self._format_labels(labels)} {histogram.total}")
+                    lines.append(f"{name}_count{self._format_labels(labels)} {histogram.count}")
+        # Chunk coalescing: events saved versus latency added
+        for key, value in coalesce_metrics.snapshot().items():
+            name = f"dobby_coalesce_{key}"
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class MultiSink(MetricsSink):
+    def __init__(self, sinks: List[MetricsSink]):
+        self.sinks = sinks
+
+    def emit(self, record: dict):
+        for sink in self.sinks:
+            try:
+                sink.emit(record)
+            except Exception as e:
+                # Metrics must never break a request
+                logger.warning("Metrics sink %s failed: %s", type(sink).__name__, e)
+
+
+prometheus_sink = PrometheusSink()
+_sink: Optional[MetricsSink] = None
+
+
+def get_metrics_sink() -> MetricsSink:
+    """The process-wide sink: Prometheus aggregation, plus JSON lines when DOBBY_METRICS_JSONL is set."""
+    global _sink
+    if _sink is None:
+        sinks: List[MetricsSink] = [prometheus_sink]
+        path = os.getenv("DOBBY_METRICS_JSONL")
+        if path:
+            sinks.append(JsonLinesSink(path))
+        _sink = MultiSink(sinks)
+    return _sink
+
+
+def set_metrics_sink(sink: MetricsSink):
+    global _sink
+    _sink = sink
+
+
+@dataclass
+class RequestMetrics:
+    """Timing and token counts for one model request, emitted when it finishes."""
+    agent: str
+    model: str
+    source: str = "upstream"
+    endpoint: Optional[str] = None
+    started: float = field(default_factory=time.monotonic)
+    first_chunk_at: Optional[float] = None
+    last_chunk_at: Optional[float] = None
+    chunks: int = 0
+    max_gap: Optional[float] = None
+    prompt_tokens: Optional[int] = None
+    cached_prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+
+    def on_chunk(self):
+        now = time.monotonic()
+        if self.first_chunk_at is None:
+            self.first_chunk_at = now
+        else:
+            gap = now - self.last_chunk_at
+            self.max_gap = gap if self.max_gap is None else max(self.max_gap, gap)
+        self.last_chunk_at = now
+        self.chunks += 1
+
+    def finish(self, error: Optional[BaseException] = None):
+        now = time.monotonic()
+        ttft = self.first_chunk_at - self.started if self.first_chunk_at is not None else None
+        tokens_per_second = None
+        if self.completion_tokens and self.first_chunk_at is not None and now > self.first_chunk_at:
+            tokens_per_second = self.completion_tokens / (now - self.first_chunk_at)
+        get_metrics_sink().emit({
+            "type": "request",
+            "ts": time.time(),
+            "agent": self.agent,
+            "model": self.model,
+            "endpoint": self.endpoint,
+            "source": self.source,
+            "ttft": ttft,
+            "duration": now - self.started,
+            "chunks": self.chunks,
+            "max_gap": self.max_gap,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_prompt_tokens": self.cached_prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "tokens_per_second": tokens_per_second,
+            "error": type(error).__name__ if error is not None else None,
+        })
+
+
+@contextmanager
+def track_phase(agent: str, phase: str):
+    """Records how long one phase of an agent request takes, as a metric and a trace span."""
+    started = time.monotonic()
+    try:
+        with get_tracer().span(phase, agent=agent):
+            yield
+    finally:
+        get_metrics_sink().emit({
+            "type": "phase",
+            "ts": time.time(),
+            "agent": agent,
+            "phase": phase,
+            "duration": time.monotonic() - started,
+        })
+
+
+def record_outcome(agent: str, metric: str, outcome: str):
+    """Counts one outcome of an agent decision, e.g. which path resolved forge metadata."""
+    get_metrics_sink().emit({
+        "type": "outcome",
+        "ts": time.time(),
+        "agent": agent,
+        "metric": metric,
+        "outcome": outcome,
+    })
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_sink.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serves GET /metrics from a background thread, next to the agent server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="dobby-metrics", daemon=True).start()
+    logger.info("Serving Prometheus metrics on :%d/metrics", port)
+    return server
@@ -0,0 +1,102 @@
+import importlib.util
+import logging
+import os
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+import httpx
+
+if TYPE_CHECKING:
+    # openai is slow to import; it is loaded when the first client is built
+    from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class PoolConfig:
+    """Connection-pool settings shared by every pooled client."""
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 60.0
+    http2: bool = True
+
+    @classmethod
+    def from_env(cls) -> "PoolConfig":
+        """Reads overrides from DOBBY_HTTP_* environment variables."""
+        return cls(
+            max_connections=int(os.getenv("DOBBY_HTTP_MAX_CONNECTIONS", cls.max_connections)),
+            max_keepalive_connections=int(
+                os.getenv("DOBBY_HTTP_MAX_KEEPALIVE", cls.max_keepalive_connections)
+            ),
+            keepalive_expiry=float(os.getenv("DOBBY_HTTP_KEEPALIVE_EXPIRY", cls.keepalive_expiry)),
+            http2=os.getenv("DOBBY_HTTP2", "1").lower() not in ("0", "false", "no"),
+        )
+
+
+_config: Optional[PoolConfig] = None
+_clients: Dict[Tuple[str, str], "AsyncOpenAI"] = {}
+
+
+def configure_client_pool(config: PoolConfig) -> None:
+    """Sets the pool configuration used for clients created from now on."""
+    global _config
+    if _clients:
+        logger.warning("Client pool reconfigured after clients were created; existing clients keep old limits.")
+    _config = config
+
+
+def _pool_config() -> PoolConfig:
+    global _config
+    if _config is None:
+        _config = PoolConfig.from_env()
+    return _config
+
+
+def _build_http_client(config: PoolConfig) -> httpx.AsyncClient:
+    """Builds the pooled transport; HTTP/2 is used only when `h2` is installed."""
+    http2 = config.http2 and importlib.util.find_spec("h2") is not None
+    if config.http2 and not http2:
+        logger.warning("HTTP/2 requested but the 'h2' package is not installed; using HTTP/1.1 keep-alive.")
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry,
+        ),
+    )
+
+
+def get_client(base_url: str, api_key: str) -> "AsyncOpenAI":
+    """
+    Returns the process-wide AsyncOpenAI client for (base_url, api_key),
+    creating it on first use so warm connections are reused by every provider.
+    """
+    key = (base_url, api_key)
+    client = _clients.get(key)
+    if client is None:
+        from openai import AsyncOpenAI
+
+        client = AsyncOpenAI(
+            base_url=base_url,
+            api_key=api_key,
+            http_client=_build_http_client(_pool_config()),
+            # RetryPolicy owns retries so that every attempt reaches the router's
+            # health stats and can fail over; SDK retries would hide them
+            max_retries=0,
+        )
+        _clients[key] = client
+        logger.info("Created pooled model client for %s", base_url)
+    return client
+
+
+async def close_clients() -> None:
+    """Shutdown hook: closes every pooled client and its open connections."""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        try:
+            await client.close()
+        except Exception as e:
+            logger.warning("Error while closing model client: %s", e)
@@ -0,0 +1,116 @@
+import re
+from typing import Any, Dict, Iterable, List, Tuple
+
+import orjson
+
+try:
+    import jiter
+except ImportError:  # jiter ships with openai; without it truncated objects are not salvaged
+    jiter = None
+
+# One object member: a JSON string key, a colon, then the raw value text
+MEMBER_PATTERN = re.compile(r'\s*("(?:[^"\\]|\\.)*")\s*:(.*)', re.DOTALL)
+
+
+class IncrementalJSONParser:
+    """
+    Incrementally scans model output for the first top-level JSON object and
+    exposes each of its fields as soon as the field's value closes. Text
+    before the object (chatter, ```json fences) and after it is ignored, as
+    are braces that close without yielding any member ("{not json}").
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self.complete = False
+        self._buffer = ""
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._field_start = 0
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """Consumes a chunk and returns the (key, value) pairs that closed in it."""
+        if self.complete:
+            return []
+        self._buffer += text
+        closed = []
+        buffer = self._buffer
+        while self._pos < len(buffer):
+            char = buffer[self._pos]
+            if not self._started:
+                if char == "{":
+                    # Drop any prefix so the buffer only holds the object
+                    self._buffer = buffer = buffer[self._pos:]
+                    self._pos = 0
+                    self._started = True
+                    self._depth = 1
+                    self._field_start = 1
+            elif self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._close_field(buffer[self._field_start:self._pos], closed)
+                    self._pos += 1
+                    if not self.fields:
+                        # Not the object we want; keep scanning for the next one
+                        self._started = False
+                        continue
+                    self.complete = True
+                    break
+            elif self._depth == 1 and char == ",":
+                self._close_field(buffer[self._field_start:self._pos], closed)
+                self._field_start = self._pos + 1
+            self._pos += 1
+        return closed
+
+    def _close_field(self, text: str, closed: list):
+        """Parses one `"key": value` member; malformed members are skipped, not fatal."""
+        match = MEMBER_PATTERN.match(text)
+        if not match:
+            return
+        try:
+            key = orjson.loads(match.group(1))
+            value = orjson.loads(match.group(2).strip())
+        except orjson.JSONDecodeError:
+            return
+        if isinstance(key, str):
+            self.fields[key] = value
+            closed.append((key, value))
+
+    @property
+    def object_text(self) -> str:
+        """The raw text of the object once it is complete."""
+        return self._buffer[:self._pos] if self.complete else ""
+
+    def has(self, keys: Iterable[str]) -> bool:
+        return all(key in self.fields for key in keys)
+
+    def finish(self) -> Dict[str, Any]:
+        """
+        Returns the parsed fields. If the object never closed (e.g. the output was
+        truncated), salvages what jiter's partial mode can still read.
+        """
+        if not self._started:
+            raise ValueError("No JSON object found in model output")
+        if not self.complete and jiter is not None:
+            try:
+                # Strict partial mode: a string cut off mid-value is dropped, not returned half-read
+                partial = jiter.from_json(self._buffer.encode("utf-8"), partial_mode=True)
+                if isinstance(partial, dict):
+                    return {**partial, **self.fields}
+            except ValueError:
+                pass
+        return dict(self.fields)
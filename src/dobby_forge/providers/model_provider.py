@@ -1,13 +1,36 @@
+import asyncio
 from datetime import datetime
-from langchain_core.prompts import PromptTemplate
-from openai import AsyncOpenAI
-from typing import AsyncIterator, Optional
+import httpx
+import os
+import time
+from src.dobby_forge.metrics import RequestMetrics
+from src.dobby_forge.providers.client_pool import get_client
+from src.dobby_forge.providers.json_stream import IncrementalJSONParser
+from src.dobby_forge.providers.prompts import PromptPrefix, cached_prompt_tokens
+from src.dobby_forge.providers.rate_limit import RateLimiter, get_default_rate_limiter
+from src.dobby_forge.providers.resilience import EndpointUnavailable, FirstTokenTimeout, RetryPolicy, is_retryable
+from src.dobby_forge.providers.response_cache import ResponseCache
+from src.dobby_forge.providers.router import Endpoint, ModelRouter, get_router
+from src.dobby_forge.providers.single_flight import get_single_flight
+from src.dobby_forge.providers.tokens import count_message_tokens, count_tokens, fit_max_tokens, preload_encoding
+from src.dobby_forge.tracing import get_tracer
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+from typing import AsyncIterator, Callable, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
 import logging
 
 # Configure logging
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# Used when neither `base_url` nor MODEL_BASE_URL is given
+DEFAULT_BASE_URL = "https://api.fireworks.ai/inference/v1"
+
+# Used when `system_prompt` is "default"
+DEFAULT_SYSTEM_PROMPT = (
+    "You are a helpful assistant that can answer questions and provide information. "
+    "Today’s date is: {date_today}. Keep responses clear, concise, and helpful."
+)
+
 class ModelProvider:
     def __init__(
         self,
@@ -16,39 +39,59 @@ class ModelProvider:
         temperature: float = 0.0,
         max_tokens: Optional[int] = None,
         system_prompt: Optional[str] = "default",
-        base_url: Optional[str] = "https://api.fireworks.ai/inference/v1"
+        base_url: Optional[str] = None,
+        cache: Optional[ResponseCache] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        router: Optional[ModelRouter] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        agent_name: Optional[str] = None,
+        include_usage: Optional[bool] = None,
+        single_flight: Optional[bool] = None
     ):
         """ Initializes model, sets up OpenAI client, configures system prompt. """
         
         # Assign API Key and initialize attributes
         self.api_key = api_key
-        self.base_url = base_url
+        self.base_url = base_url or os.getenv("MODEL_BASE_URL", DEFAULT_BASE_URL)
         self.model = model
         self.temperature = temperature
         self.max_tokens = max_tokens
         self.system_prompt = system_prompt
         self.date_context = datetime.now().strftime("%Y-%m-%d")
+        self.cache = cache
+        self.retry_policy = retry_policy or RetryPolicy.from_env()
+        self.rate_limiter = rate_limiter or get_default_rate_limiter()
+        # Label used in metrics, and whether to ask the stream for a final usage chunk
+        self.agent_name = agent_name or "default"
+        if include_usage is None:
+            include_usage = os.getenv("DOBBY_STREAM_USAGE", "1").lower() not in ("0", "false", "no")
+        self.include_usage = include_usage
+        # Opt-in sharing of identical in-flight temperature-0 requests (or DOBBY_SINGLE_FLIGHT=1)
+        if single_flight is None:
+            single_flight = os.getenv("DOBBY_SINGLE_FLIGHT", "0").lower() in ("1", "true", "yes")
+        self.single_flight = get_single_flight() if single_flight else None
 
-        # Set up OpenAI client
-        self.client = AsyncOpenAI(
-            base_url=self.base_url,
-            api_key=self.api_key,
+        # Route across this endpoint plus any extras configured in DOBBY_MODEL_ENDPOINTS
+        self.router = router or get_router(
+            ModelRouter.endpoints_from_env(Endpoint(self.base_url, self.api_key, self.model))
         )
 
         # Configure system prompt
         self._configure_system_prompt()
+        self.default_prefix = PromptPrefix(system=self.system_prompt)
+
+        # Load the tokenizer at startup, off the event loop, so counting never downloads
+        preload_encoding()
+
+    @property
+    def client(self):
+        """The process-wide pooled client for this endpoint, created on first use."""
+        return get_client(self.base_url, self.api_key)
 
     def _configure_system_prompt(self):
         """ Configures the system prompt, allowing for dynamic or custom templates. """
         if self.system_prompt == "default":
-            system_prompt_template = PromptTemplate(
-                input_variables=["date_today"],
-                template=(
-                    "You are a helpful assistant that can answer questions and provide information. "
-                    "Today’s date is: {date_today}. Keep responses clear, concise, and helpful."
-                ),
-            )
-            self.system_prompt = system_prompt_template.format(date_today=self.date_context)
+            self.system_prompt = DEFAULT_SYSTEM_PROMPT.format(date_today=self.date_context)
         else:
             # If the user has provided a custom system prompt, use it
             self.system_prompt = self.system_prompt
@@ -58,66 +101,447 @@ class ModelProvider:
         query: str,
         temperature: Optional[float] = None,  # Accept temperature as an optional argument
         max_tokens: Optional[int] = None,  # Accept max_tokens as an optional argument
-        top_p: Optional[float] = None  # Accept top_p as an optional argument
+        top_p: Optional[float] = None,  # Accept top_p as an optional argument
+        prefix: Optional[PromptPrefix] = None,  # Static leading messages, kept ahead of the query
+        stop: Optional[Sequence[str]] = None,  # Sequences that end generation early
+        history: Optional[Sequence[Mapping]] = None  # Earlier conversation messages, oldest first
     ) -> AsyncIterator[str]:
         """Sends query to model and yields the response in chunks."""
         
-        # Use the provided temperature, max_tokens, and top_p, or default to the instance values
-        temperature = temperature or self.temperature
-        max_tokens = max_tokens or self.max_tokens
-        top_p = top_p or 1.0  # Default value for top_p if not provided
-        
-        # Define message format based on the model type
-        messages = self._prepare_messages(query)
+        # Not made the current span: this generator's body runs interleaved with its caller
+        tracer = get_tracer()
+        span = tracer.start_span("query_stream", {"agent": self.agent_name, "model": self.model})
+        error = None
+        try:
+            # Use the provided temperature, max_tokens, and top_p, or default to the instance values.
+            # Compared with None so that an explicit 0.0 is honoured.
+            temperature = self.temperature if temperature is None else temperature
+            max_tokens = self.max_tokens if max_tokens is None else max_tokens
+            top_p = 1.0 if top_p is None else top_p  # Default value for top_p if not provided
+            stop = list(stop) if stop else None
         
+            # Define message format based on the model type
+            messages = self._prepare_messages(query, prefix, history)
+
+            # Keep prompt plus completion inside the model's context window
+            max_tokens = fit_max_tokens(self.model, count_message_tokens(messages), max_tokens)
+            span.set_attribute("max_tokens", max_tokens)
+
+            # Serve from the response cache when possible, replaying it as chunks
+            cache_key = None
+            if self.cache is not None and self.cache.is_cacheable(temperature):
+                cache_key = self.cache.make_key(self.model, messages, temperature, top_p, max_tokens, stop)
+                cached = await self.cache.get(cache_key)
+                span.set_attribute("cache_hit", cached is not None)
+                if cached is not None:
+                    metrics = RequestMetrics(agent=self.agent_name, model=self.model, source="cache")
+                    metrics.prompt_tokens = count_message_tokens(messages)
+                    metrics.completion_tokens = count_tokens(cached)
+                    for chunk in self.cache.replay(cached):
+                        metrics.on_chunk()
+                        yield chunk
+                    metrics.finish()
+                    return
+
+            def open_upstream():
+                return self._stream_upstream(messages, temperature, max_tokens, top_p, stop, cache_key)
+
+            # Identical deterministic requests already in flight share one upstream stream
+            if self.single_flight is not None and temperature == 0.0:
+                key = cache_key or ResponseCache.make_key(self.model, messages, temperature, top_p, max_tokens, stop)
+                source = self.single_flight.stream(key, open_upstream)
+                span.set_attribute("single_flight", True)
+            else:
+                source = open_upstream()
+            try:
+                async for chunk in source:
+                    yield chunk
+            finally:
+                await source.aclose()
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            tracer.end_span(span, error)
+
+    async def _stream_upstream(self, messages, temperature, max_tokens, top_p, stop, cache_key) -> AsyncIterator[str]:
+        """Streams one upstream request, recording its metrics and caching the full response."""
+        metrics = RequestMetrics(agent=self.agent_name, model=self.model)
+        collected = []
+        opened = None
+        error = None
+        try:
+            # Open the upstream stream with retries/hedging until the first chunk arrives
+            opened = await self._open_with_retries(messages, temperature, max_tokens, top_p, stop)
+            metrics.endpoint = opened.endpoint
+            if opened.first is not None:
+                collected.append(opened.first)
+                metrics.on_chunk()
+                yield opened.first
+
+            # Past the first chunk nothing is retried: the caller has already seen output
+            async for content in opened.contents:
+                collected.append(content)
+                metrics.on_chunk()
+                yield content
+        except Exception as e:
+            # Log errors and re-raise
+            error = e
+            logger.error("Error while streaming query: %s", e)
+            raise e
+        finally:
+            if opened is not None:
+                await opened.close()
+            # Prefer the provider's usage report; fall back to counting locally
+            usage = opened.usage if opened is not None else None
+            if usage is not None:
+                metrics.prompt_tokens = usage.prompt_tokens
+                metrics.completion_tokens = usage.completion_tokens
+                metrics.cached_prompt_tokens = cached_prompt_tokens(usage)
+            else:
+                metrics.prompt_tokens = count_message_tokens(messages)
+                metrics.completion_tokens = count_tokens("".join(collected))
+            metrics.finish(error)
+
+        # Only complete responses are stored
+        if cache_key is not None and collected:
+            await self.cache.set(cache_key, "".join(collected))
+
+    async def _open_with_retries(self, messages, temperature, max_tokens, top_p, stop) -> "_OpenedStream":
+        """Retries transient failures with jittered exponential backoff."""
+        policy = self.retry_policy
+        # Endpoints already tried for this request; retries fail over to the others
+        tried = []
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(policy.max_attempts),
+            wait=wait_random_exponential(multiplier=policy.initial_backoff, max=policy.max_backoff),
+            retry=retry_if_exception(is_retryable),
+            before_sleep=lambda state: logger.warning(
+                "Retrying model request (attempt %d): %s", state.attempt_number, state.outcome.exception()
+            ),
+            reraise=True,
+        ):
+            with attempt:
+                return await self._open_hedged(messages, temperature, max_tokens, top_p, stop, tried)
+
+    async def _open_hedged(self, messages, temperature, max_tokens, top_p, stop, tried: list) -> "_OpenedStream":
+        """
+        Opens one stream, and if its first token misses the hedge deadline,
+        a second one (on another endpoint when possible); whichever produces
+        a first token first wins.
+        """
+        def open_once():
+            endpoint = self.router.pick(exclude=tried)
+            tried.append(endpoint)
+            return asyncio.create_task(
+                self._open_stream(endpoint, messages, temperature, max_tokens, top_p, stop)
+            )
+
+        pending = {open_once()}
+        hedged = self.retry_policy.hedge_after is None
+        error = None
+        try:
+            while pending:
+                timeout = None if hedged else self.retry_policy.hedge_after
+                done, pending = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    hedged = True
+                    try:
+                        pending.add(open_once())
+                        logger.info("First token past hedge deadline; starting hedged request.")
+                    except EndpointUnavailable:
+                        # No endpoint can take a hedge; keep waiting on the primary
+                        pass
+                    continue
+                for task in done:
+                    if task.exception() is None:
+                        # Close any other winner that finished in the same tick
+                        for other in done - {task}:
+                            if other.exception() is None:
+                                await other.result().close()
+                        return task.result()
+                    error = task.exception()
+                if not hedged and not pending:
+                    # The primary failed before the deadline; let the retry loop handle it
+                    break
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _open_stream(self, endpoint: Endpoint, messages, temperature, max_tokens, top_p, stop) -> "_OpenedStream":
+        """
+        Sends the request to `endpoint` and waits, bounded by the first-token
+        timeout, for the first content. Feeds the outcome back to the router.
+        """
+        policy = self.retry_policy
+        started = time.monotonic()
+        self.router.acquire(endpoint)
+        opened = None
         try:
-            # Send query to OpenAI and stream the response
-            stream = await self.client.chat.completions.create(
-                model=self.model,
+            stream = await get_client(endpoint.base_url, endpoint.api_key).chat.completions.create(
+                model=endpoint.model,
                 messages=messages,
                 stream=True,
                 temperature=temperature,  # Pass the temperature here
                 max_tokens=max_tokens,    # Pass the max_tokens here
                 top_p=top_p,              # Pass the top_p here
+                **({"stop": stop} if stop else {}),
+                timeout=httpx.Timeout(policy.read_timeout, connect=policy.connect_timeout),
+                **({"stream_options": {"include_usage": True}} if self.include_usage else {}),
             )
-
-            async for chunk in stream:
-                # Yield the response chunk by chunk
-                if chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
-        except Exception as e:
-            # Log errors and re-raise
-            logger.error(f"Error while streaming query: {e}")
-            raise e
-
+            opened = _OpenedStream(stream, endpoint.label, on_close=lambda: self.router.release(endpoint))
+            try:
+                opened.first = await asyncio.wait_for(
+                    opened.contents.__anext__(), policy.first_token_timeout
+                )
+            except StopAsyncIteration:
+                opened.first = None
+            except asyncio.TimeoutError:
+                raise FirstTokenTimeout(
+                    f"No first token from {endpoint.label} within {policy.first_token_timeout}s"
+                )
+        except BaseException as e:
+            if isinstance(e, Exception) and is_retryable(e):
+                self.router.record_failure(endpoint)
+            else:
+                # Says nothing about the endpoint's health (a bad request, or cancelled as a
+                # hedge loser), but a half-open probe must not stay claimed forever
+                self.router.release_probe(endpoint)
+            if opened is not None:
+                await opened.close()
+            else:
+                self.router.release(endpoint)
+            raise
+        self.router.record_success(endpoint, time.monotonic() - started)
+        return opened
 
     async def query(
         self,
-        query: str
+        query: str,
+        **kwargs  # Any other `query_stream` argument, e.g. prefix or temperature
     ) -> str:
         """Sends query to model and returns the complete response as a string."""
         
         try:
             # Collect all chunks into a full response
             chunks = []
-            async for chunk in self.query_stream(query=query):
+            async for chunk in self.query_stream(query=query, **kwargs):
                 chunks.append(chunk)
             response = "".join(chunks)
             return response
         except Exception as e:
-            logger.error(f"Error while processing query: {e}")
+            logger.error("Error while processing query: %s", e)
             return "An error occurred while processing your request."
 
-    def _prepare_messages(self, query: str) -> list:
-        """Prepares the appropriate message format for the model based on the model type."""
-        
+    async def stream_json(
+        self,
+        query: str,
+        required_keys: Iterable[str] = (),
+        **kwargs  # Any other `query_stream` argument
+    ) -> AsyncIterator[Tuple[str, object]]:
+        """
+        Streams (key, value) pairs of the JSON object in the response as each value
+        closes. The upstream stream is stopped once every `required_keys` entry has
+        been seen, or as soon as the object closes.
+        """
+        required_keys = tuple(required_keys)
+        parser = IncrementalJSONParser()
+
+        # Complete objects are cached on their own: the upstream is usually stopped
+        # once the object closes, before query_stream would cache the response
+        cache_key = self._json_cache_key(query, kwargs)
+        if cache_key is not None:
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                for field in parser.feed(cached):
+                    yield field
+                return
+
+        stream = self.query_stream(query=query, **kwargs)
+        has_required = False
+        try:
+            async for chunk in stream:
+                for field in parser.feed(chunk):
+                    yield field
+                has_required = bool(required_keys) and parser.has(required_keys)
+                if parser.complete or has_required:
+                    break
+        finally:
+            # Closing the generator cancels the upstream request
+            await stream.aclose()
+        if parser.complete:
+            if cache_key is not None:
+                await self.cache.set(cache_key, parser.object_text)
+        elif not has_required:
+            # The output was cut off: fields that only the partial parse could recover.
+            # Not done when we stopped it ourselves, since the rest is mid-stream by design.
+            for key, value in parser.finish().items():
+                if key not in parser.fields:
+                    yield key, value
+
+    def _json_cache_key(self, query: str, kwargs: Mapping) -> Optional[str]:
+        """Cache key for the parsed object of a `stream_json` call, or None when not cacheable."""
+        temperature = self.temperature if kwargs.get("temperature") is None else kwargs["temperature"]
+        if self.cache is None or not self.cache.is_cacheable(temperature):
+            return None
+        messages = self._prepare_messages(query, kwargs.get("prefix"), kwargs.get("history"))
+        max_tokens = self.max_tokens if kwargs.get("max_tokens") is None else kwargs["max_tokens"]
+        top_p = 1.0 if kwargs.get("top_p") is None else kwargs["top_p"]
+        stop = list(kwargs["stop"]) if kwargs.get("stop") else None
+        # Kept apart from full responses, which a plain query_stream may replay
+        return "json:" + self.cache.make_key(self.model, messages, temperature, top_p, max_tokens, stop)
+
+    async def query_json(
+        self,
+        query: str,
+        required_keys: Iterable[str] = (),
+        **kwargs  # Any other `query_stream` argument
+    ) -> dict:
+        """
+        Returns the JSON object in the response, tolerating code fences and text
+        around it. Raises ValueError when no object or a required key is missing.
+        """
+        required_keys = tuple(required_keys)
+        result = {}
+        async for key, value in self.stream_json(query, required_keys, **kwargs):
+            result[key] = value
+        if not result:
+            raise ValueError("Model response contained no JSON object")
+        missing = [key for key in required_keys if key not in result]
+        if missing:
+            raise ValueError(f"Model response is missing keys: {', '.join(missing)}")
+        return result
+
+    async def query_many(
+        self,
+        prompts: Sequence[Union[str, Mapping]],
+        concurrency: int = 8,
+        rate_limiter: Optional[RateLimiter] = None,
+        return_exceptions: bool = True
+    ) -> List[Union[str, Exception]]:
+        """
+        Runs many prompts concurrently and returns their responses in input order.
+        Each prompt is a query string or a mapping of `query_stream` arguments.
+        Failed prompts yield their exception unless `return_exceptions` is False.
+        """
+        results: List[Union[str, Exception, None]] = [None] * len(prompts)
+        async for index, result in self.stream_many(prompts, concurrency, rate_limiter):
+            if isinstance(result, Exception) and not return_exceptions:
+                raise result
+            results[index] = result
+        return results
+
+    async def stream_many(
+        self,
+        prompts: Iterable[Union[str, Mapping]],
+        concurrency: int = 8,
+        rate_limiter: Optional[RateLimiter] = None
+    ) -> AsyncIterator[Tuple[int, Union[str, Exception]]]:
+        """
+        Runs prompts with at most `concurrency` in flight and yields
+        (input index, response or exception) pairs as they complete.
+        Prompts are pulled lazily, so `prompts` may be an unbounded iterator.
+        """
+        rate_limiter = rate_limiter or self.rate_limiter
+        items = enumerate(prompts)
+        # Bounded so a slow consumer pauses the workers instead of buffering results
+        results = asyncio.Queue(maxsize=concurrency)
+        done = object()
+
+        async def worker():
+            try:
+                for index, item in items:
+                    kwargs = {"query": item} if isinstance(item, str) else dict(item)
+                    try:
+                        if rate_limiter is not None:
+                            await rate_limiter.acquire(self._estimate_tokens(kwargs))
+                        chunks = [chunk async for chunk in self.query_stream(**kwargs)]
+                        result = "".join(chunks)
+                    except Exception as e:
+                        logger.error("Error while processing prompt %d: %s", index, e)
+                        result = e
+                    await results.put((index, result))
+            except Exception as e:
+                # The prompt iterator itself failed; surface it to the consumer
+                await results.put(e)
+            await results.put(done)
+
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+        try:
+            running = len(workers)
+            while running:
+                item = await results.get()
+                if item is done:
+                    running -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            for task in workers:
+                task.cancel()
+
+    def _estimate_tokens(self, kwargs: Mapping) -> int:
+        """Rough prompt-plus-completion token estimate used for rate limiting."""
+        max_tokens = kwargs.get("max_tokens") or self.max_tokens or 0
+        messages = self._prepare_messages(kwargs["query"], kwargs.get("prefix"), kwargs.get("history"))
+        return count_message_tokens(messages) + max_tokens
+
+    def _prepare_messages(
+        self,
+        query: str,
+        prefix: Optional[PromptPrefix] = None,
+        history: Optional[Sequence[Mapping]] = None
+    ) -> list:
+        """
+        Prepares the appropriate message format for the model based on the model type.
+        The static prefix (the provider's system prompt unless one is given) always
+        comes first and unchanged, then any conversation history, then the query.
+        """
+        prefix = prefix or self.default_prefix
+        history = history or ()
+
         # If using smaller models, use specific message formats
         if self.model in ["o1-preview", "o1-mini"]:
+            # No system role: earlier turns travel as a transcript inside the one user message
+            transcript = "".join(f"{m['role']}: {m['content']}\n" for m in history)
+            conversation = f" Conversation so far:\n{transcript}" if transcript else ""
             return [
-                {"role": "user", "content": f"System Instruction: {self.system_prompt}\n Instruction: {query}"}
+                {"role": "user", "content": f"System Instruction: {prefix.flattened}\n{conversation} Instruction: {query}"}
             ]
         else:
-            return [
-                {"role": "system", "content": self.system_prompt},
-                {"role": "user", "content": query}
-            ]
+            return [*prefix.messages, *history, {"role": "user", "content": query}]
+
+
+class _OpenedStream:
+    """An upstream stream plus the first content chunk already read from it."""
+
+    def __init__(self, stream, endpoint: str, on_close: Optional[Callable[[], None]] = None):
+        self.stream = stream
+        self.endpoint = endpoint
+        self.first: Optional[str] = None
+        self.usage = None
+        self.contents = self._iter_contents()
+        self._on_close = on_close
+        self._closed = False
+
+    async def _iter_contents(self) -> AsyncIterator[str]:
+        async for chunk in self.stream:
+            if getattr(chunk, "usage", None) is not None:
+                self.usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await self.contents.aclose()
+            await self.stream.close()
+        finally:
+            if self._on_close is not None:
+                self._on_close()
@@ -0,0 +1,32 @@
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Tuple
+
+
+@dataclass(frozen=True)
+class PromptPrefix:
+    """
+    The static head of a conversation: a system prompt plus optional fixed
+    context messages. Its messages are built once and sent byte-identical,
+    ahead of the variable part, so upstream prefix/KV caches can reuse them.
+    """
+    system: str
+    context: Tuple[str, ...] = ()
+
+    @cached_property
+    def messages(self) -> Tuple[dict, ...]:
+        return (
+            {"role": "system", "content": self.system},
+            *({"role": "user", "content": text} for text in self.context),
+        )
+
+    @cached_property
+    def flattened(self) -> str:
+        """The prefix as one string, for models without a system role."""
+        return "\n".join((self.system,) + self.context)
+
+
+def cached_prompt_tokens(usage) -> int:
+    """Prompt tokens served from the provider's prefix cache, when the API reports them."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return getattr(details, "cached_tokens", None) or 0
@@ -0,0 +1,79 @@
+import asyncio
+import os
+import time
+from typing import Optional
+
+
+class _TokenBucket:
+    """Refills `per_minute` units evenly over each minute, holding at most one minute's worth."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available (0 when they already are)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limiter shared by concurrent requests."""
+
+    def __init__(self, requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None):
+        self._requests = _TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = _TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        # Waiters are served one at a time, in arrival order
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["RateLimiter"]:
+        """Builds a limiter from DOBBY_RPM / DOBBY_TPM, or returns None when neither is set."""
+        rpm = os.getenv("DOBBY_RPM")
+        tpm = os.getenv("DOBBY_TPM")
+        if not rpm and not tpm:
+            return None
+        return cls(int(rpm) if rpm else None, int(tpm) if tpm else None)
+
+    async def acquire(self, tokens: int = 0):
+        """Waits until one request and `tokens` tokens fit in the budget, then consumes them."""
+        async with self._lock:
+            while True:
+                wait = 0.0
+                if self._requests is not None:
+                    wait = max(wait, self._requests.wait_time(1))
+                if self._tokens is not None:
+                    wait = max(wait, self._tokens.wait_time(tokens))
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            if self._requests is not None:
+                self._requests.take(1)
+            if self._tokens is not None:
+                self._tokens.take(tokens)
+
+
+_default_limiter: Optional[RateLimiter] = None
+_default_loaded = False
+
+
+def get_default_rate_limiter() -> Optional[RateLimiter]:
+    """Returns the process-wide limiter configured by DOBBY_RPM / DOBBY_TPM, if any."""
+    global _default_limiter, _default_loaded
+    if not _default_loaded:
+        _default_limiter = RateLimiter.from_env()
+        _default_loaded = True
+    return _default_limiter
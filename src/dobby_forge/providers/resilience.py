@@ -0,0 +1,57 @@
+import asyncio
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+# Upstream statuses worth another attempt: timeouts, conflicts, throttling and server errors
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+
+class FirstTokenTimeout(Exception):
+    """Raised when the upstream stream opened but no content arrived in time."""
+
+
+class EndpointUnavailable(Exception):
+    """Raised when the only usable endpoints are half-open with their probe in flight."""
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    Timeouts, retries and hedging for one streamed request. Retries and hedges
+    only ever happen before the first chunk has been handed to the caller.
+    """
+    max_attempts: int = 3
+    initial_backoff: float = 0.5
+    max_backoff: float = 8.0
+    connect_timeout: float = 5.0
+    read_timeout: float = 60.0
+    first_token_timeout: float = 30.0
+    # Start a second request when the first token is later than this (e.g. the p95 TTFT)
+    hedge_after: Optional[float] = None
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        """Reads overrides from DOBBY_RETRY_* / DOBBY_*_TIMEOUT / DOBBY_HEDGE_AFTER variables."""
+        hedge_after = os.getenv("DOBBY_HEDGE_AFTER")
+        return cls(
+            max_attempts=int(os.getenv("DOBBY_RETRY_ATTEMPTS", cls.max_attempts)),
+            initial_backoff=float(os.getenv("DOBBY_RETRY_BACKOFF", cls.initial_backoff)),
+            max_backoff=float(os.getenv("DOBBY_RETRY_MAX_BACKOFF", cls.max_backoff)),
+            connect_timeout=float(os.getenv("DOBBY_CONNECT_TIMEOUT", cls.connect_timeout)),
+            read_timeout=float(os.getenv("DOBBY_READ_TIMEOUT", cls.read_timeout)),
+            first_token_timeout=float(os.getenv("DOBBY_FIRST_TOKEN_TIMEOUT", cls.first_token_timeout)),
+            hedge_after=float(hedge_after) if hedge_after else None,
+        )
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """True for transient failures: timeouts, connection errors, busy probes, 408/409/429 and 5xx."""
+    # Imported here so that importing this module does not pull in openai
+    import openai
+
+    if isinstance(exc, (FirstTokenTimeout, EndpointUnavailable, asyncio.TimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code in RETRYABLE_STATUS_CODES or exc.status_code >= 500
+    return False
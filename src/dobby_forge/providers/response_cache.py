@@ -0,0 +1,178 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryCacheBackend:
+    """In-memory LRU store with per-entry expiry."""
+
+    blocking = False
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        self._entries[key] = (time.time() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class SQLiteCacheBackend:
+    """On-disk store that survives restarts; evicts least recently used rows past `max_entries`."""
+
+    blocking = True
+
+    def __init__(self, path: str, max_entries: int = 10000, table: str = "responses"):
+        self.path = path
+        self.max_entries = max_entries
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, used_at REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_used_at ON {table} (used_at)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET used_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return row[0]
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, used_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now),
+            )
+            self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at < ?", (now,))
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f" SELECT key FROM {self.table} ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+
+class ResponseCache:
+    """
+    Caches complete model responses keyed on model, messages and sampling params.
+    By default only deterministic (temperature 0) requests are cached.
+    """
+
+    def __init__(
+        self,
+        backend=None,
+        ttl: float = 3600.0,
+        deterministic_only: bool = True,
+        replay_chunk_size: int = 64,
+    ):
+        self.backend = backend or MemoryCacheBackend()
+        self.ttl = ttl
+        self.deterministic_only = deterministic_only
+        self.replay_chunk_size = replay_chunk_size
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        """Builds a cache from DOBBY_CACHE_* variables; DOBBY_CACHE_PATH selects the SQLite backend."""
+        max_entries = int(os.getenv("DOBBY_CACHE_MAX_ENTRIES", "1024"))
+        path = os.getenv("DOBBY_CACHE_PATH")
+        if path:
+            backend = SQLiteCacheBackend(path, max_entries=max_entries)
+        else:
+            backend = MemoryCacheBackend(max_entries=max_entries)
+        return cls(backend=backend, ttl=float(os.getenv("DOBBY_CACHE_TTL", "3600")))
+
+    def is_cacheable(self, temperature: float) -> bool:
+        return not self.deterministic_only or temperature == 0.0
+
+    @staticmethod
+    def make_key(model: str, messages: list, temperature: float, top_p: float, max_tokens: Optional[int],
+                 stop: Optional[list] = None) -> str:
+        # Stop sequences are only part of the key when set, so existing entries stay valid
+        payload = json.dumps(
+            [model, messages, temperature, top_p, max_tokens] + ([stop] if stop else []),
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        # A failing cache must never fail the request
+        try:
+            if self.backend.blocking:
+                value = await asyncio.to_thread(self.backend.get, key)
+            else:
+                value = self.backend.get(key)
+        except Exception as e:
+            logger.warning("Failed to read cached response: %s", e)
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: str) -> None:
+        try:
+            if self.backend.blocking:
+                await asyncio.to_thread(self.backend.set, key, value, self.ttl)
+            else:
+                self.backend.set(key, value, self.ttl)
+        except Exception as e:
+            logger.warning("Failed to store cached response: %s", e)
+
+    def replay(self, value: str):
+        """Splits a cached response back into chunks so cache hits stream like live responses."""
+        size = self.replay_chunk_size
+        for start in range(0, len(value), size):
+            yield value[start:start + size]
+
+
+_default_cache: Optional[ResponseCache] = None
+
+
+def get_default_cache() -> ResponseCache:
+    """Returns the process-wide cache shared by every agent."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResponseCache.from_env()
+    return _default_cache
@@ -0,0 +1,199 @@
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.dobby_forge.providers.resilience import EndpointUnavailable
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    """One OpenAI-compatible backend the router can send requests to."""
+    base_url: str
+    api_key: str
+    model: str
+    name: Optional[str] = None
+
+    @property
+    def label(self) -> str:
+        return self.name or self.base_url
+
+
+class CircuitBreaker:
+    """
+    Ejects an endpoint after `failure_threshold` consecutive failures and lets a
+    single probe request through once `reset_timeout` seconds have passed.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def release_probe(self):
+        """Frees the half-open probe slot when the probe ended without a verdict."""
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            # Failed probes re-open the breaker for another full timeout
+            self.opened_at = time.monotonic()
+
+
+class EndpointStats:
+    """Rolling health of one endpoint: EWMA time-to-first-token and error rate."""
+
+    def __init__(self, alpha: float, breaker: CircuitBreaker):
+        self.alpha = alpha
+        self.breaker = breaker
+        self.ewma_ttft: Optional[float] = None
+        self.error_rate = 0.0
+        self.inflight = 0
+
+    def record_success(self, ttft: float):
+        if self.ewma_ttft is None:
+            self.ewma_ttft = ttft
+        else:
+            self.ewma_ttft = self.alpha * ttft + (1 - self.alpha) * self.ewma_ttft
+        self.error_rate = (1 - self.alpha) * self.error_rate
+        self.breaker.record_success()
+
+    def record_failure(self):
+        self.error_rate = self.alpha + (1 - self.alpha) * self.error_rate
+        self.breaker.record_failure()
+
+    def score(self) -> float:
+        """Lower is better. Unmeasured endpoints score 0 so they get explored first."""
+        ttft = self.ewma_ttft or 0.0
+        return ttft * (1 + self.inflight) * (1 + 4 * self.error_rate)
+
+
+class ModelRouter:
+    """Picks an endpoint per request by latency and errors, ejecting unhealthy ones."""
+
+    def __init__(
+        self,
+        endpoints: Iterable[Endpoint],
+        alpha: float = 0.2,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+    ):
+        self.endpoints: List[Endpoint] = list(endpoints)
+        if not self.endpoints:
+            raise ValueError("ModelRouter needs at least one endpoint")
+        self.stats: Dict[Endpoint, EndpointStats] = {
+            endpoint: EndpointStats(alpha, CircuitBreaker(failure_threshold, reset_timeout))
+            for endpoint in self.endpoints
+        }
+
+    @property
+    def primary(self) -> Endpoint:
+        return self.endpoints[0]
+
+    def pick(self, exclude: Iterable[Endpoint] = ()) -> Endpoint:
+        """
+        Returns the healthy endpoint with the best score, skipping `exclude`
+        (endpoints already tried for this request) while alternatives remain.
+        Raises EndpointUnavailable rather than send more than one probe to a
+        half-open endpoint.
+        """
+        exclude = set(exclude)
+        candidates = [e for e in self.endpoints if e not in exclude] or self.endpoints
+        healthy = [e for e in candidates if self.stats[e].breaker.state != "open"]
+        if not healthy:
+            # Everything is ejected: fall back to the endpoint that failed least recently
+            logger.warning("All model endpoints are ejected; routing to the oldest failure.")
+            return min(candidates, key=lambda e: self.stats[e].breaker.opened_at or 0.0)
+        for endpoint in sorted(healthy, key=lambda e: self.stats[e].score()):
+            if self.stats[endpoint].breaker.allow():
+                return endpoint
+        # Only half-open endpoints with their single probe in flight are left. Retrying
+        # an already-tried closed endpoint beats piling more traffic onto the probe.
+        for endpoint in sorted(self.endpoints, key=lambda e: self.stats[e].score()):
+            if self.stats[endpoint].breaker.state == "closed":
+                return endpoint
+        raise EndpointUnavailable("Every usable model endpoint is waiting on a half-open probe")
+
+    def acquire(self, endpoint: Endpoint):
+        self.stats[endpoint].inflight += 1
+
+    def release(self, endpoint: Endpoint):
+        self.stats[endpoint].inflight -= 1
+
+    def record_success(self, endpoint: Endpoint, ttft: float):
+        self.stats[endpoint].record_success(ttft)
+
+    def release_probe(self, endpoint: Endpoint):
+        self.stats[endpoint].breaker.release_probe()
+
+    def record_failure(self, endpoint: Endpoint):
+        stats = self.stats[endpoint]
+        was_open = stats.breaker.state != "closed"
+        stats.record_failure()
+        if not was_open and stats.breaker.state == "open":
+            logger.warning("Ejecting model endpoint %s after %d failures", endpoint.label, stats.breaker.failures)
+
+    @staticmethod
+    def endpoints_from_env(primary: Endpoint) -> List[Endpoint]:
+        """
+        The primary endpoint followed by any extras listed in DOBBY_MODEL_ENDPOINTS, a JSON list of
+        objects with base_url, model and optionally name, api_key or api_key_env.
+        """
+        endpoints = [primary]
+        raw = os.getenv("DOBBY_MODEL_ENDPOINTS")
+        if not raw:
+            return endpoints
+        for spec in json.loads(raw):
+            api_key = spec.get("api_key") or os.getenv(spec.get("api_key_env", ""), "") or primary.api_key
+            endpoints.append(
+                Endpoint(
+                    base_url=spec["base_url"],
+                    api_key=api_key,
+                    model=spec.get("model", primary.model),
+                    name=spec.get("name"),
+                )
+            )
+        return endpoints
+
+
+_routers: Dict[Tuple[Endpoint, ...], ModelRouter] = {}
+
+
+def get_router(endpoints: Iterable[Endpoint]) -> ModelRouter:
+    """Returns the process-wide router for this endpoint set so health stats are shared."""
+    key = tuple(endpoints)
+    router = _routers.get(key)
+    if router is None:
+        router = ModelRouter(key)
+        _routers[key] = router
+    return router
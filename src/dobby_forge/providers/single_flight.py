@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from typing import AsyncIterator, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a flight in a subscriber's queue
+_END = object()
+
+
+class FlightCancelled(Exception):
+    """Raised to subscribers of a flight whose upstream stream was cancelled part-way."""
+
+
+class _Flight:
+    """One upstream stream fanned out to every subscriber, each with its own buffer."""
+
+    def __init__(self, source: AsyncIterator[str], on_done: Callable[[], None]):
+        self.chunks = []
+        self.subscribers = set()
+        self.done = False
+        self.error: Optional[Exception] = None
+        self._on_done = on_done
+        self._task = asyncio.create_task(self._run(source))
+
+    async def _run(self, source: AsyncIterator[str]):
+        try:
+            async for chunk in source:
+                self.chunks.append(chunk)
+                for queue in self.subscribers:
+                    queue.put_nowait(chunk)
+        except asyncio.CancelledError:
+            # A truncated response must never look like a complete one
+            self.error = FlightCancelled("Shared upstream stream was cancelled")
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            # Later identical requests start a new flight (or hit the response cache)
+            self.done = True
+            self._on_done()
+            for queue in self.subscribers:
+                queue.put_nowait(self.error or _END)
+
+    def subscribe(self) -> asyncio.Queue:
+        # Unbounded per-subscriber queues: a slow consumer only grows its own buffer
+        queue = asyncio.Queue()
+        for chunk in self.chunks:
+            queue.put_nowait(chunk)
+        if self.done:
+            queue.put_nowait(self.error or _END)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+        if not self.subscribers and not self.done:
+            # Nobody is listening any more; stop paying for the upstream stream. Leave the
+            # registry now so no request joins the flight while it is being torn down.
+            self._on_done()
+            self._task.cancel()
+
+
+class SingleFlight:
+    """Attaches concurrent identical requests to a single upstream stream."""
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self.started = 0
+        self.joined = 0
+
+    def _discard(self, key: str, flight: _Flight):
+        # Only remove `flight` itself; a newer flight may already own the key
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    async def stream(self, key: str, open_source: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """
+        Yields the response for `key`, joining an in-flight stream when one exists
+        (replaying what it already produced) or starting one with `open_source()`.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(open_source(), on_done=lambda: self._discard(key, flight))
+            self._flights[key] = flight
+            self.started += 1
+        else:
+            self.joined += 1
+            logger.info("Joined in-flight request (%d already attached)", len(flight.subscribers), extra={"sample": True})
+
+        queue = flight.subscribe()
+        try:
+            while True:
+                item = await queue.get()
+                if item is _END:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            flight.unsubscribe(queue)
+
+
+_default_single_flight: Optional[SingleFlight] = None
+
+
+def get_single_flight() -> SingleFlight:
+    """Returns the process-wide single-flight registry shared by every provider."""
+    global _default_single_flight
+    if _default_single_flight is None:
+        _default_single_flight = SingleFlight()
+    return _default_single_flight
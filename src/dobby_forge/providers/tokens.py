@@ -0,0 +1,91 @@
+import logging
+import threading
+from functools import lru_cache
+from typing import Iterable, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+# tiktoken has no Llama vocabulary; cl100k_base is a close enough approximation for budgeting
+DEFAULT_ENCODING = "cl100k_base"
+
+# Per-message overhead of the chat template (role markers and separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_encoding = None
+_encoding_loader: Optional[threading.Thread] = None
+
+
+def _load_encoding():
+    global _encoding
+    try:
+        import tiktoken
+        _encoding = tiktoken.get_encoding(DEFAULT_ENCODING)
+    except Exception as e:
+        # e.g. no network to fetch the BPE file; keep the character heuristic
+        logger.warning("tiktoken unavailable, estimating tokens from length: %s", e)
+
+
+def preload_encoding():
+    """
+    Starts loading the tokenizer on a background thread. The first load may
+    download the BPE file, which must not block the event loop; until it is
+    ready, tokens are estimated from length. Safe to call more than once.
+    """
+    global _encoding_loader
+    if _encoding_loader is None:
+        _encoding_loader = threading.Thread(target=_load_encoding, name="dobby-tiktoken", daemon=True)
+        _encoding_loader.start()
+
+
+@lru_cache(maxsize=1024)
+def _count_encoded(text: str) -> int:
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def count_tokens(text: str) -> int:
+    """Counts tokens in `text` locally. Cached, since static prompts repeat on every call."""
+    if _encoding is None:
+        preload_encoding()
+        return max(1, len(text) // 4) if text else 0
+    return _count_encoded(text)
+
+
+def count_message_tokens(messages: Iterable[Mapping]) -> int:
+    """Counts prompt tokens for a chat message list."""
+    return sum(count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+
+# Context windows by model name fragment; the first match wins
+CONTEXT_WINDOWS = (
+    ("llama-3-3", 131072),
+    ("llama-v3p3", 131072),
+    ("llama-3-1", 131072),
+    ("llama-v3p1", 131072),
+)
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Headroom for the gap between cl100k_base counts and the model's own tokenizer
+CONTEXT_SAFETY_TOKENS = 64
+
+
+def context_window(model: str) -> int:
+    """The model's context window, or a conservative default for unknown models."""
+    name = (model or "").lower()
+    for fragment, window in CONTEXT_WINDOWS:
+        if fragment in name:
+            return window
+    return DEFAULT_CONTEXT_WINDOW
+
+
+def fit_max_tokens(model: str, prompt_tokens: int, max_tokens: Optional[int]) -> Optional[int]:
+    """
+    Clamps `max_tokens` so prompt plus completion fit the context window.
+    Raises ValueError when the prompt alone does not fit.
+    """
+    window = context_window(model)
+    if prompt_tokens >= window:
+        raise ValueError(f"Prompt is ~{prompt_tokens} tokens; {model} has a {window}-token context window")
+    available = max(1, window - prompt_tokens - CONTEXT_SAFETY_TOKENS)
+    if max_tokens is None:
+        return None
+    return min(max_tokens, available)
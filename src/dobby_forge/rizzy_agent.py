@@ -8,29 +8,55 @@ from sentient_agent_framework import (
     Query,
     ResponseHandler
 )
+from src.dobby_forge.admission import AdaptiveLimiter, AdmissionConfig, AdmissionRejected, session_key
+from src.dobby_forge.memory import SessionMemory, conversation_id, provider_summarizer
 from src.dobby_forge.providers.model_provider import ModelProvider
+from src.dobby_forge.providers.prompts import PromptPrefix
+from src.dobby_forge.metrics import start_metrics_server
+from src.dobby_forge.streaming import pipe_stream
+from src.dobby_forge.log import configure_logging
+from src.dobby_forge.tracing import get_tracer
 from typing import AsyncIterator
 
-load_dotenv()
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+RIZZY_PREFIX = PromptPrefix(
+    system="""You are a dating friend, designed to be a tinder/hinge/bumble chat response generator, an outrageously charismatic friend who gives authentic, witty, flirty lines. 
+It should be SHORT, easygoing, light, concise, simple, casual,chill, warm, vibey, carefree, cool. The key is not to try too hard.
+NEVER be generic. Keep the text message you give the user SUPER SHORT and use text acronyms when applicable (like 'ur' instead of 'your', m2, omw, ik, etc.). Only give one answer. 2 sentences at max, ever.
+For your answers: give the text message the user needs to paste to the dating app FIRST, and then maybe your super short reasoning. 
+Always start with: [Say:"the txt message"], then maybe your SUPER SHORT description."""
+)
+
+# The reply is one [Say:"..."] line plus an optional short note; anything after a blank line is padding
+RIZZY_STOP = ("\n\n",)
+
 
 class RizzyAgent(AbstractAgent):
+    # Short replies: admit many at once, but give up quickly rather than keep a chat waiting
+    admission_config = AdmissionConfig(initial_limit=32, max_limit=128, target_ttft=1.5, queue_timeout=5.0)
+
     def __init__(self, name: str):
         super().__init__(name)
 
         model_api_key = os.getenv("MODEL_API_KEY")
         if not model_api_key:
             raise ValueError("MODEL_API_KEY is not set")
-        self._model_provider = ModelProvider(api_key=model_api_key)
+        self._model_provider = ModelProvider(api_key=model_api_key, agent_name=name)
+        self._admission = AdaptiveLimiter(AdmissionConfig.from_env(self.admission_config), name=name)
+        # Follow-ups in the same chat see the earlier exchanges
+        self._memory = SessionMemory.from_env(
+            summarize=provider_summarizer(self._model_provider), namespace=type(self).__name__
+        )
 
         self.persona = "rebellious startup founder"
         self.style = "sarcastic and witty"
         self.loyalty = "startups and innovation"
         self.temperature = 0.7
         self.top_p = 0.9
-        self.max_tokens = 256
+        # Two short sentences at most
+        self.max_tokens = 80
 
     async def assist(
         self,
@@ -39,33 +65,48 @@ class RizzyAgent(AbstractAgent):
         response_handler: ResponseHandler
     ):
         """Generate a sarcastic, witty social media post promoting startups and innovation."""
-        await response_handler.emit_text_block(
-            "GENERATE",
-            "Cooking up a brutally honest startup post with extra wit..."
-        )
+        with get_tracer().span("assist", agent=self.name, session=session_key(session)):
+            await response_handler.emit_text_block(
+                "GENERATE",
+                "Cooking up a brutally honest startup post with extra wit..."
+            )
 
-        prompt = (query.prompt or "").strip()
-        full_prompt = (
-            f"""You are a dating friend, designed to be a tinder/hinge/bumble chat response generator, an outrageously charismatic friend who gives authentic, witty, flirty lines. 
-It should be SHORT, easygoing, light, concise, simple, casual,chill, warm, vibey, carefree, cool. The key is not to try too hard.
-NEVER be generic. Keep the text message you give the user SUPER SHORT and use text acronyms when applicable (like 'ur' instead of 'your', m2, omw, ik, etc.). Only give one answer. 2 sentences at max, ever.
-For your answers: give the text message the user needs to paste to the dating app FIRST, and then maybe your super short reasoning. 
-Always start with: [Say:"the txt message"], then maybe your SUPER SHORT description."""
-        )
+            # The persona is a static system prefix; the user's chat context is the variable part
+            prompt = (query.prompt or "").strip() or "Give me an opener."
+            conversation = conversation_id(session)
+            history = await self._memory.history(conversation)
 
-        stream = response_handler.create_text_stream("FINAL_RESPONSE")
-        try:
-            # Process the model response and stream it
-            async for chunk in self._model_provider.query_stream(full_prompt):
-                await stream.emit_chunk(chunk)
-        except Exception as e:
-            logger.error(f"Error processing request: {str(e)}")
-            await stream.emit_chunk("Error generating response")
+            stream = response_handler.create_text_stream("FINAL_RESPONSE")
+            try:
+                # Stream the model response, coalescing small deltas into fewer events
+                chunks = self._admission.stream(
+                    session_key(session),
+                    lambda: self._memory.record(conversation, prompt, self._model_provider.query_stream(
+                        prompt,
+                        prefix=RIZZY_PREFIX,
+                        temperature=self.temperature,
+                        top_p=self.top_p,
+                        max_tokens=self.max_tokens,
+                        stop=RIZZY_STOP,
+                        history=history,
+                    )),
+                )
+                await pipe_stream(chunks, stream)
+            except AdmissionRejected as e:
+                await stream.emit_chunk(str(e))
+            except Exception as e:
+                logger.error("Error processing request: %s", e)
+                await stream.emit_chunk("Error generating response")
         
-        await stream.complete()
-        await response_handler.complete()
+            await stream.complete()
+            await response_handler.complete()
 
 if __name__ == "__main__":
-    agent = RizzyAgent(name="Dobby Agent")
+    # Environment and logging are set up at startup, not import, so importing the agent stays cheap
+    load_dotenv()
+    configure_logging()
+    agent = RizzyAgent(name="Rizzy Agent")
     server = DefaultServer(agent)
+    if os.getenv("DOBBY_METRICS_PORT"):
+        start_metrics_server(int(os.getenv("DOBBY_METRICS_PORT")))
     server.run()
@@ -0,0 +1,135 @@
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+
+@dataclass(frozen=True)
+class CoalesceConfig:
+    """
+    How upstream deltas are merged into response events: a buffer is flushed once
+    it holds `max_bytes`, or `max_latency` seconds after its first delta arrived.
+    `queue_size` bounds how far the upstream reader may run ahead of the emitter.
+    """
+    max_bytes: int = 256
+    max_latency: float = 0.03
+    queue_size: int = 64
+
+    @classmethod
+    def from_env(cls) -> "CoalesceConfig":
+        """Reads overrides from DOBBY_COALESCE_BYTES / _LATENCY_MS / _QUEUE."""
+        return cls(
+            max_bytes=int(os.getenv("DOBBY_COALESCE_BYTES", cls.max_bytes)),
+            max_latency=float(os.getenv("DOBBY_COALESCE_LATENCY_MS", cls.max_latency * 1000)) / 1000,
+            queue_size=int(os.getenv("DOBBY_COALESCE_QUEUE", cls.queue_size)),
+        )
+
+
+class CoalesceMetrics:
+    """Process-wide counters comparing upstream deltas with emitted events."""
+
+    def __init__(self):
+        self.upstream_chunks = 0
+        self.events_emitted = 0
+        self.added_latency_total = 0.0
+        self.added_latency_max = 0.0
+
+    @property
+    def events_saved(self) -> int:
+        return self.upstream_chunks - self.events_emitted
+
+    def record_flush(self, pieces: int, added_latency: float):
+        self.upstream_chunks += pieces
+        self.events_emitted += 1
+        self.added_latency_total += added_latency
+        self.added_latency_max = max(self.added_latency_max, added_latency)
+
+    def snapshot(self) -> dict:
+        return {
+            "upstream_chunks": self.upstream_chunks,
+            "events_emitted": self.events_emitted,
+            "events_saved": self.events_saved,
+            "added_latency_avg": self.added_latency_total / self.events_emitted if self.events_emitted else 0.0,
+            "added_latency_max": self.added_latency_max,
+        }
+
+
+coalesce_metrics = CoalesceMetrics()
+
+_default_config: Optional[CoalesceConfig] = None
+
+# Marks the end of the upstream stream in the queue
+_END = object()
+
+
+def default_coalesce_config() -> CoalesceConfig:
+    global _default_config
+    if _default_config is None:
+        _default_config = CoalesceConfig.from_env()
+    return _default_config
+
+
+async def pipe_stream(chunks: AsyncIterator[str], stream, config: Optional[CoalesceConfig] = None):
+    """
+    Forwards `chunks` to a response text stream, coalescing small deltas into
+    fewer `emit_chunk` events. Upstream errors are raised after flushing what
+    was already received.
+    """
+    config = config or default_coalesce_config()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=config.queue_size)
+
+    async def read_upstream():
+        try:
+            async for chunk in chunks:
+                # Blocks when the emitter falls behind, pausing the upstream read
+                await queue.put(chunk)
+        except Exception as e:
+            await queue.put(e)
+        await queue.put(_END)
+
+    reader = asyncio.create_task(read_upstream())
+    buffer = []
+    buffered_bytes = 0
+    first_at = 0.0
+    error = None
+
+    async def flush():
+        nonlocal buffer, buffered_bytes
+        if buffer:
+            await stream.emit_chunk("".join(buffer))
+            coalesce_metrics.record_flush(len(buffer), time.monotonic() - first_at)
+            buffer = []
+            buffered_bytes = 0
+
+    try:
+        while True:
+            if buffer:
+                remaining = first_at + config.max_latency - time.monotonic()
+                try:
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError
+                    item = await asyncio.wait_for(queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    await flush()
+                    continue
+            else:
+                item = await queue.get()
+
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                error = item
+                break
+            if not buffer:
+                first_at = time.monotonic()
+            buffer.append(item)
+            buffered_bytes += len(item.encode("utf-8"))
+            if buffered_bytes >= config.max_bytes:
+                await flush()
+        await flush()
+    finally:
+        reader.cancel()
+
+    if error is not None:
+        raise error
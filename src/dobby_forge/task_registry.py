@@ -0,0 +1,124 @@
+import json
+import logging
+import os
+from dataclasses import dataclass
+from string import Formatter
+from typing import Dict, Optional, Tuple
+
+from src.dobby_forge.providers.prompts import PromptPrefix
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TASKS_PATH = os.path.join(os.path.dirname(__file__), "tasks.json")
+
+# Values a directive or instruction template may reference
+ALLOWED_FIELDS = frozenset({"persona", "style", "loyalty", "task", "content"})
+
+
+def _placeholders(template: str, where: str) -> Tuple[str, ...]:
+    """The named fields in a str.format template; rejects positional or unknown ones."""
+    try:
+        fields = tuple(name for _, name, _, _ in Formatter().parse(template) if name is not None)
+    except ValueError as e:
+        raise ValueError(f"{where}: malformed template: {e}")
+    unknown = [name for name in fields if name not in ALLOWED_FIELDS]
+    if unknown:
+        raise ValueError(
+            f"{where}: unknown placeholder(s) {', '.join(repr(n) for n in unknown)}; "
+            f"allowed: {', '.join(sorted(ALLOWED_FIELDS))}"
+        )
+    return fields
+
+
+@dataclass(frozen=True)
+class TaskTemplate:
+    """One forge task: its prompt template, sampling defaults and static prefix."""
+    name: str
+    template: str  # directives and instruction, joined once at load time
+    fields: Tuple[str, ...]
+    prefix: PromptPrefix
+    keywords: Tuple[str, ...]
+    temperature: float
+    top_p: float
+    max_tokens: int
+    stop: Tuple[str, ...] = ()
+
+    def render(self, values: dict) -> str:
+        """Fills the template; raises ValueError when a placeholder has no value."""
+        missing = [field for field in self.fields if not values.get(field)]
+        if missing:
+            raise ValueError(f"Task {self.name} needs {', '.join(repr(f) for f in missing)}")
+        return self.template.format(**{field: values[field] for field in self.fields})
+
+
+class TaskRegistry:
+    """Forge tasks loaded and validated once from a JSON file; adding a task is a data change."""
+
+    def __init__(self, system: str, tasks: Dict[str, TaskTemplate], default_task: str):
+        self.system = system
+        self.tasks = tasks
+        self.default_task = default_task
+        self.keywords = {name: task.keywords for name, task in tasks.items() if task.keywords}
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_TASKS_PATH) -> "TaskRegistry":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+
+        system = data["system"]
+        directives = data["directives"]
+        _placeholders(directives, "directives")
+        defaults = data.get("defaults", {})
+        # Every task shares the system prompt, so they share one prefix (and one upstream cache entry)
+        prefix = PromptPrefix(system=system)
+
+        tasks = {}
+        for name, spec in data["tasks"].items():
+            name = name.upper()
+            where = f"task {name}"
+            template = f"{directives}\n\n{spec['instruction']}"
+            temperature = float(spec.get("temperature", defaults.get("temperature", 0.7)))
+            top_p = float(spec.get("top_p", defaults.get("top_p", 1.0)))
+            max_tokens = int(spec["max_tokens"])
+            if not 0.0 <= temperature <= 2.0 or not 0.0 < top_p <= 1.0 or max_tokens <= 0:
+                raise ValueError(f"{where}: temperature, top_p or max_tokens out of range")
+            tasks[name] = TaskTemplate(
+                name=name,
+                template=template,
+                fields=_placeholders(template, where),
+                prefix=PromptPrefix(system=spec["system"]) if "system" in spec else prefix,
+                keywords=tuple(k.lower() for k in spec.get("keywords", ())),
+                temperature=temperature,
+                top_p=top_p,
+                max_tokens=max_tokens,
+                stop=tuple(spec.get("stop", ())),
+            )
+
+        default_task = data.get("default_task", "CODE").upper()
+        if default_task not in tasks:
+            raise ValueError(f"default_task {default_task!r} is not a defined task")
+        return cls(system, tasks, default_task)
+
+    @property
+    def names(self) -> Tuple[str, ...]:
+        return tuple(self.tasks)
+
+    def get(self, name: Optional[str]) -> TaskTemplate:
+        """The named task, or the default task (with a warning) when it is unknown."""
+        key = (name or self.default_task).upper()
+        task = self.tasks.get(key)
+        if task is None:
+            logger.warning("Unknown task '%s' provided. Defaulting to %s.", name, self.default_task)
+            task = self.tasks[self.default_task]
+        return task
+
+
+_default_registry: Optional[TaskRegistry] = None
+
+
+def get_task_registry() -> TaskRegistry:
+    """The process-wide registry, loaded once from DOBBY_TASKS_PATH or the bundled tasks.json."""
+    global _default_registry
+    if _default_registry is None:
+        _default_registry = TaskRegistry.load(os.getenv("DOBBY_TASKS_PATH", DEFAULT_TASKS_PATH))
+    return _default_registry
@@ -0,0 +1,191 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# OTLP status codes
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("dobby_span", default=None)
+
+
+class Span:
+    """
+    One timed operation, shaped like an OpenTelemetry span (trace and span ids,
+    parent, attributes, status) so exports load into any OTLP-aware tool.
+    """
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, attributes: Optional[dict] = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent.span_id if parent is not None else None
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status = STATUS_OK
+        self.status_message = ""
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def record_error(self, error: BaseException):
+        self.status = STATUS_ERROR
+        self.status_message = f"{type(error).__name__}: {error}"
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items() if v is not None],
+            "status": {"code": self.status, "message": self.status_message},
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+
+def _otlp_attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class NoopExporter:
+    """Default exporter: spans are timed and correlated with logs, but not written anywhere."""
+
+    enabled = False
+
+    def export(self, span: Span):
+        pass
+
+    def shutdown(self):
+        pass
+
+
+class OTLPFileExporter:
+    """
+    Appends finished spans as OTLP/JSON lines (the OpenTelemetry Collector file
+    exporter format), for local testing. Writes happen on a background thread.
+    """
+
+    enabled = True
+
+    def __init__(self, path: str, service_name: str = "dobby-forge", batch_size: int = 64):
+        self.path = path
+        self.batch_size = batch_size
+        self._resource = {"attributes": [_otlp_attribute("service.name", service_name)]}
+        self._queue: "queue.SimpleQueue[Optional[Span]]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="otlp-file-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span):
+        self._queue.put(span)
+
+    def shutdown(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                span = self._queue.get()
+                batch: List[Span] = [] if span is None else [span]
+                # Drain whatever else is waiting into one line
+                while span is not None and len(batch) < self.batch_size:
+                    try:
+                        span = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if span is not None:
+                        batch.append(span)
+                if batch:
+                    f.write(json.dumps(self._payload(batch)) + "\n")
+                    f.flush()
+                if span is None:
+                    return
+
+    def _payload(self, spans: List[Span]) -> dict:
+        return {
+            "resourceSpans": [{
+                "resource": self._resource,
+                "scopeSpans": [{
+                    "scope": {"name": "dobby_forge"},
+                    "spans": [span.to_otlp() for span in spans],
+                }],
+            }]
+        }
+
+
+class Tracer:
+    def __init__(self, exporter=None):
+        self.exporter = exporter or NoopExporter()
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        """DOBBY_TRACE_EXPORTER=otlp-file writes spans to DOBBY_TRACE_FILE (default traces.jsonl)."""
+        name = os.getenv("DOBBY_TRACE_EXPORTER", "none").lower()
+        if name == "otlp-file":
+            exporter = OTLPFileExporter(os.getenv("DOBBY_TRACE_FILE", "traces.jsonl"))
+            atexit.register(exporter.shutdown)
+            return cls(exporter)
+        if name not in ("none", "noop", ""):
+            logger.warning("Unknown DOBBY_TRACE_EXPORTER %r; tracing is disabled", name)
+        return cls()
+
+    def start_span(self, name: str, attributes: Optional[dict] = None, parent: Optional[Span] = None) -> Span:
+        """Starts a span under `parent` (default: the current span) without making it current."""
+        return Span(name, parent if parent is not None else _current_span.get(), attributes)
+
+    def end_span(self, span: Span, error: Optional[BaseException] = None):
+        if error is not None:
+            span.record_error(error)
+        span.end_ns = time.time_ns()
+        self.exporter.export(span)
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        """Runs the block inside a new current span; child spans and log lines attach to it."""
+        span = self.start_span(name, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            self.end_span(span)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+_default_tracer: Optional[Tracer] = None
+
+
+def get_tracer() -> Tracer:
+    """The process-wide tracer configured by DOBBY_TRACE_EXPORTER."""
+    global _default_tracer
+    if _default_tracer is None:
+        _default_tracer = Tracer.from_env()
+    return _default_tracer
@@ -0,0 +1,47 @@
+import socket
+
+import pytest
+
+from benchmarks.fake_openai_server import FakeServerConfig, start_in_thread
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class FakeServer:
+    """A running fake OpenAI server plus the number of requests it has received."""
+
+    def __init__(self, config: FakeServerConfig):
+        self.config = config
+        self.port = _free_port()
+        self._server = start_in_thread(config, self.port)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    @property
+    def requests(self) -> int:
+        return self._server.config.app.state.requests
+
+    def stop(self):
+        self._server.should_exit = True
+
+
+@pytest.fixture
+def fake_server():
+    """Factory fixture: `fake_server(ttft=..., fail_first=...)` starts a server for the test."""
+    servers = []
+
+    def start(**overrides) -> FakeServer:
+        config = FakeServerConfig(**{"ttft": 0.01, "tokens_per_second": 1000.0, "completion_tokens": 8, **overrides})
+        server = FakeServer(config)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
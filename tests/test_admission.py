@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+
+from src.dobby_forge.admission import AdaptiveLimiter, AdmissionConfig, AdmissionRejected
+
+
+def make_limiter(**overrides) -> AdaptiveLimiter:
+    return AdaptiveLimiter(AdmissionConfig(**{"initial_limit": 1, "queue_timeout": 1.0, **overrides}))
+
+
+async def settle():
+    """Lets queued tasks run up to their next wait."""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_limit_grows_additively_on_healthy_requests():
+    limiter = make_limiter(initial_limit=4)
+    limiter.record(ttft=0.1)
+    assert limiter.limit == pytest.approx(4.25)
+    for _ in range(100):
+        limiter.record(ttft=0.1)
+    assert limiter.limit > 5
+
+
+def test_limit_backs_off_once_per_congestion_window():
+    limiter = make_limiter(initial_limit=10, target_ttft=2.0, decrease=0.5, min_limit=2)
+    limiter.record(ttft=5.0)
+    assert limiter.limit == 5
+    # Requests already in flight report the same congestion: no second cut
+    limiter.record(ttft=None, failed=True)
+    assert limiter.limit == 5
+    limiter._last_decrease -= 2.0
+    limiter.record(ttft=None, failed=True)
+    limiter._last_decrease -= 2.0
+    limiter.record(ttft=None, failed=True)
+    assert limiter.limit == 2
+
+
+def test_waiters_are_admitted_round_robin_across_sessions():
+    async def run():
+        limiter = make_limiter()
+        await limiter.acquire("holder")
+        order = []
+
+        async def request(key, name):
+            await limiter.acquire(key)
+            order.append(name)
+            limiter.release()
+
+        tasks = [asyncio.create_task(request(key, name))
+                 for key, name in (("a", "a1"), ("a", "a2"), ("a", "a3"), ("b", "b1"))]
+        await settle()
+        limiter.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    # The chatty session does not starve "b", which queued last
+    assert asyncio.run(run()) == ["a1", "b1", "a2", "a3"]
+
+
+def test_request_is_rejected_when_the_queue_is_full():
+    async def run():
+        limiter = make_limiter(queue_size=1)
+        await limiter.acquire("holder")
+        waiter = asyncio.create_task(limiter.acquire("a"))
+        await settle()
+        with pytest.raises(AdmissionRejected):
+            await limiter.acquire("b")
+        limiter.release()
+        await waiter
+        return limiter.snapshot()
+
+    snapshot = asyncio.run(run())
+    assert snapshot["rejected"] == 1
+    assert snapshot["queued"] == 0
+
+
+def test_request_is_rejected_after_the_queue_deadline():
+    async def run():
+        limiter = make_limiter(queue_timeout=0.05)
+        await limiter.acquire("holder")
+        with pytest.raises(AdmissionRejected):
+            await limiter.acquire("a")
+        return limiter.snapshot()
+
+    snapshot = asyncio.run(run())
+    assert snapshot["queued"] == 0
+    assert snapshot["inflight"] == 1
+
+
+def test_slot_granted_to_a_cancelled_waiter_is_handed_on():
+    async def run():
+        limiter = make_limiter()
+        await limiter.acquire("holder")
+        first = asyncio.create_task(limiter.acquire("a"))
+        second = asyncio.create_task(limiter.acquire("b"))
+        await settle()
+        # The slot goes to "a", whose caller leaves before it resumes
+        limiter.release()
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        await asyncio.wait_for(second, 1.0)
+        return limiter.snapshot()
+
+    snapshot = asyncio.run(run())
+    assert snapshot["inflight"] == 1
+    assert snapshot["queued"] == 0
+
+
+def test_stream_feeds_ttft_back_and_releases_its_slot():
+    async def run():
+        limiter = make_limiter(initial_limit=2)
+
+        async def source():
+            yield "a"
+            yield "b"
+
+        chunks = [chunk async for chunk in limiter.stream("a", source)]
+        return chunks, limiter
+
+    chunks, limiter = asyncio.run(run())
+    assert chunks == ["a", "b"]
+    assert limiter.inflight == 0
+    assert limiter.limit == pytest.approx(2.5)
@@ -0,0 +1,29 @@
+import json
+from types import SimpleNamespace
+
+from src.dobby_forge.batch import BatchRunner, Checkpoint, repair_output
+
+
+def test_repair_output_drops_partial_line_and_reports_only_inflight_rows(tmp_path):
+    path = tmp_path / "out.jsonl"
+    rows = [{"line": n, "output": "x"} for n in range(5)]
+    path.write_text("".join(json.dumps(row) + "\n" for row in rows) + '{"line": 5, "out')
+    assert repair_output(str(path), {3, 4, 5, 9}) == {3, 4}
+    assert path.read_text().endswith('"x"}\n')
+
+
+def test_invalid_rows_are_checkpointed_when_written(tmp_path):
+    specs = tmp_path / "specs.jsonl"
+    specs.write_text('[1, 2]\n{"task": "CODE"}\n')
+    output = tmp_path / "out.jsonl"
+    args = SimpleNamespace(input=str(specs), output=str(output), checkpoint=None)
+    runner = BatchRunner(provider=None, args=args)
+
+    with open(output, "a", encoding="utf-8") as runner._output:
+        next(runner.specs())
+
+    # A crash now must not write the invalid row again on resume
+    saved = Checkpoint(f"{output}.ckpt")
+    saved.load()
+    assert saved.is_done(0)
+    assert [json.loads(row)["line"] for row in output.read_text().splitlines()] == [0]
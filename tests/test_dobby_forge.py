@@ -0,0 +1,108 @@
+import asyncio
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from src.dobby_forge.dobby_forge import DobbyAgentForge, TaskRequestError, _differs_materially, _task_request
+
+
+def test_persona_counts_only_when_the_guess_had_one():
+    # Without an explicit cue the LLM's persona is its own invention
+    assert not _differs_materially({"task": "SOCIAL"}, {"task": "SOCIAL", "persona": "pirate"})
+    assert _differs_materially({"task": "SOCIAL", "persona": "pirate"}, {"task": "SOCIAL", "persona": "cowboy"})
+
+
+def test_same_directives_are_not_material():
+    guessed = {"task": "SOCIAL", "persona": "crypto bro", "style": "BLUNT"}
+    assert not _differs_materially(guessed, {**guessed, "persona": "Crypto  Bro", "style": "blunt"})
+    assert not _differs_materially(guessed, {**guessed, "temperature": 0.2})
+
+
+def test_task_request_errors_carry_the_user_facing_message():
+    with pytest.raises(TaskRequestError, match=r"Task SUMMARIZE needs 'content'\.$"):
+        _task_request({"task": "SUMMARIZE", "content": ""}, [])
+
+
+def test_task_registry_is_not_loaded_at_import():
+    # DOBBY_TASKS_PATH may come from .env, which is only read at startup
+    code = (
+        "import src.dobby_forge.dobby_forge, src.dobby_forge.task_registry as registry;"
+        "assert registry._default_registry is None"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+class FakeModel:
+    """Stands in for the agent's ModelProvider: canned metadata and a counted stream."""
+
+    def __init__(self, metadata):
+        self.metadata = metadata
+        self.streams = []
+
+    async def query_json(self, query, **kwargs):
+        # Extraction takes a while, so the speculative stream gets going meanwhile
+        await asyncio.sleep(0.02)
+        if isinstance(self.metadata, Exception):
+            raise self.metadata
+        return dict(self.metadata)
+
+    async def query_stream(self, query, **kwargs):
+        self.streams.append(query)
+        for word in ("to ", "the ", "moon"):
+            await asyncio.sleep(0.01)
+            yield word
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.events = []
+
+    def create_text_stream(self, name):
+        handler = self
+
+        class Stream:
+            async def emit_chunk(self, chunk):
+                handler.events.append(chunk)
+
+            async def complete(self):
+                pass
+
+        return Stream()
+
+    async def complete(self):
+        pass
+
+
+def run_speculative(monkeypatch, metadata) -> tuple:
+    monkeypatch.setenv("MODEL_API_KEY", "test-key")
+    agent = DobbyAgentForge(speculative=True)
+    agent._model = FakeModel(metadata)
+    handler = RecordingHandler()
+    # A task keyword but nothing else: below the local confidence threshold, so it speculates
+    query = SimpleNamespace(prompt="Write a tweet about bitcoin")
+    asyncio.run(agent.assist(SimpleNamespace(activity_id=None), query, handler))
+    return agent, handler
+
+
+def test_speculation_hit_keeps_the_first_stream(monkeypatch):
+    metadata = {"persona": "Degen Philosopher", "task": "SOCIAL", "style": "BLUNT", "loyalty": "STRICT"}
+    agent, handler = run_speculative(monkeypatch, metadata)
+    assert "".join(handler.events) == "to the moon"
+    assert len(agent._model.streams) == 1
+    assert agent.speculation == {"hit": 1}
+
+
+def test_speculation_miss_restarts_generation(monkeypatch):
+    agent, handler = run_speculative(monkeypatch, {"task": "CODE"})
+    assert "".join(handler.events) == "to the moon"
+    assert len(agent._model.streams) == 2
+    assert agent.speculation == {"miss": 1}
+
+
+def test_failed_extraction_keeps_the_speculative_stream(monkeypatch):
+    agent, handler = run_speculative(monkeypatch, RuntimeError("upstream down"))
+    assert "".join(handler.events) == "to the moon"
+    assert len(agent._model.streams) == 1
+    assert agent.speculation == {"hit": 1}
@@ -0,0 +1,7 @@
+from src.dobby_forge.host import AGENTS
+
+
+def test_agent_names_are_unique():
+    # Names label each agent's metrics and admission logs
+    names = [name for _, name in AGENTS.values()]
+    assert len(set(names)) == len(names)
@@ -0,0 +1,34 @@
+from src.dobby_forge.providers.json_stream import IncrementalJSONParser
+
+
+def feed_all(parser, chunks):
+    return [field for chunk in chunks for field in parser.feed(chunk)]
+
+
+def test_fields_close_across_chunks_and_fences():
+    parser = IncrementalJSONParser()
+    fields = feed_all(parser, ['```json\n{"task": "SO', 'CIAL", "style"', ': "BLUNT"}\n```'])
+    assert fields == [("task", "SOCIAL"), ("style", "BLUNT")]
+    assert parser.complete
+    assert parser.object_text == '{"task": "SOCIAL", "style": "BLUNT"}'
+
+
+def test_braces_without_members_are_skipped():
+    parser = IncrementalJSONParser()
+    fields = feed_all(parser, ['here is {not json} then ', '{"task":"CODE"}'])
+    assert fields == [("task", "CODE")]
+    assert parser.complete
+    assert parser.object_text == '{"task":"CODE"}'
+
+
+def test_truncated_trailing_string_is_not_salvaged():
+    parser = IncrementalJSONParser()
+    feed_all(parser, ['{"task": "CODE", "persona": "Unhinged Fr'])
+    assert not parser.complete
+    assert parser.finish() == {"task": "CODE"}
+
+
+def test_unclosed_object_salvages_complete_trailing_value():
+    parser = IncrementalJSONParser()
+    feed_all(parser, ['{"task": "CODE", "persona": "pirate"'])
+    assert parser.finish() == {"task": "CODE", "persona": "pirate"}
@@ -0,0 +1,33 @@
+import subprocess
+import sys
+
+
+def test_configured_level_applies_to_every_logger():
+    code = "\n".join([
+        "import logging",
+        "from src.dobby_forge import log",
+        "from src.dobby_forge.providers import client_pool",
+        "log.configure_logging(logging.WARNING)",
+        "logging.getLogger('pinned').setLevel(logging.INFO)",
+        "logging.getLogger('pinned').info('pinned info')",
+        "client_pool.logger.info('module info')",
+        "client_pool.logger.warning('module warning')",
+    ])
+    # Run apart from pytest's own log capture, which replaces root handlers
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert "pinned info" not in result.stderr
+    assert "module info" not in result.stderr
+    assert "module warning" in result.stderr
+
+
+def test_http_client_request_lines_are_not_logged():
+    code = "\n".join([
+        "import logging",
+        "from src.dobby_forge import log",
+        "log.configure_logging(logging.INFO)",
+        "logging.getLogger('httpx').info('HTTP Request: POST /v1/chat/completions')",
+        "logging.getLogger('httpx').warning('httpx warning')",
+    ])
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert "HTTP Request" not in result.stderr
+    assert "httpx warning" in result.stderr
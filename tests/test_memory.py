@@ -0,0 +1,38 @@
+import asyncio
+
+from src.dobby_forge import memory as memory_module
+from src.dobby_forge.memory import MemoryConfig, SessionMemory
+
+
+def test_compaction_keeps_unsummarized_turns_when_the_backlog_is_trimmed(monkeypatch):
+    # One token per turn: the window holds one exchange, the backlog three turns
+    monkeypatch.setattr(memory_module, "_turn_tokens", lambda turn: 1)
+    config = MemoryConfig(window_tokens=2, max_pending_tokens=3)
+    transcripts = []
+    release = asyncio.Event()
+
+    async def summarize(transcript, max_tokens):
+        transcripts.append(transcript)
+        await release.wait()
+        return f"summary {len(transcripts)}"
+
+    async def run():
+        memory = SessionMemory(config=config, summarize=summarize)
+        await memory.append("s", "u0", "a0")
+        await memory.append("s", "u1", "a1")
+        # Let the background summary of exchange 0 start
+        await asyncio.sleep(0)
+        # Meanwhile the backlog overflows and its oldest turns are dropped
+        await memory.append("s", "u2", "a2")
+        await memory.append("s", "u3", "a3")
+        release.set()
+        while memory._compacting:
+            await asyncio.sleep(0.01)
+        return await memory._load("s")
+
+    state = asyncio.run(run())
+    assert "user: u0" in transcripts[0]
+    # Exchange 2 left the window during the first summary and must reach the next one
+    assert "user: u2" in transcripts[1] and "assistant: a2" in transcripts[1]
+    assert state["pending"] == []
+    assert state["summary"] == "summary 2"
@@ -0,0 +1,30 @@
+import pytest
+
+from src.dobby_forge.metadata_parser import extract_metadata_locally
+
+
+@pytest.mark.parametrize("description", [
+    "I would like a tweet about bitcoin",
+    "I'd like a summary of this article: bitcoin hit a new high today",
+    "Summarize this as a list",
+])
+def test_ordinary_phrasing_is_not_a_persona(description):
+    local = extract_metadata_locally(description)
+    assert "persona" not in local.metadata
+    # The task alone must not be enough to skip the LLM
+    assert local.confidence < 0.6
+
+
+@pytest.mark.parametrize("description, persona", [
+    ("persona: crypto bro, write a tweet about ETH", "crypto bro"),
+    ("Write a tweet in the voice of a cowboy about ETH", "cowboy"),
+    ("Write a tweet about bitcoin talking like a pirate", "pirate"),
+    ("Pretend to be a grumpy sysadmin and summarize this", "grumpy sysadmin"),
+])
+def test_explicit_persona_cues(description, persona):
+    assert extract_metadata_locally(description).metadata["persona"] == persona
+
+
+def test_task_keyword_needs_a_single_match():
+    assert extract_metadata_locally("Write a tweet about bitcoin").metadata["task"] == "SOCIAL"
+    assert "task" not in extract_metadata_locally("Summarize this python script").metadata
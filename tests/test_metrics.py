@@ -0,0 +1,34 @@
+import json
+
+from src.dobby_forge import metrics
+from src.dobby_forge.metrics import JsonLinesSink
+from src.dobby_forge.providers import tokens
+
+
+def test_json_lines_sink_writes_records_in_order(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    sink = JsonLinesSink(str(path))
+    for i in range(100):
+        sink.emit({"type": "request", "n": i})
+    sink.close()
+    assert [json.loads(line)["n"] for line in path.read_text().splitlines()] == list(range(100))
+
+
+def test_count_tokens_estimates_until_the_encoding_is_loaded(monkeypatch):
+    monkeypatch.setattr(tokens, "_encoding", None)
+    # A loader already "running" must not be started again, and counting must not wait for it
+    monkeypatch.setattr(tokens, "_encoding_loader", object())
+    assert tokens.count_tokens("a" * 40) == 10
+    assert tokens.count_tokens("") == 0
+
+
+def test_outcomes_are_prometheus_counters(monkeypatch):
+    sink = metrics.PrometheusSink()
+    monkeypatch.setattr(metrics, "_sink", sink)
+    for path in ("local", "local", "llm"):
+        metrics.record_outcome("forge", "metadata_path", path)
+    metrics.record_outcome("forge", "speculation", "hit")
+    rendered = sink.render()
+    assert 'dobby_metadata_path_total{agent="forge",path="local"} 2' in rendered
+    assert 'dobby_metadata_path_total{agent="forge",path="llm"} 1' in rendered
+    assert 'dobby_speculation_total{agent="forge",outcome="hit"} 1' in rendered
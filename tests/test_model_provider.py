@@ -0,0 +1,174 @@
+import asyncio
+
+import openai
+import pytest
+
+from src.dobby_forge.providers.client_pool import close_clients
+from src.dobby_forge.providers.model_provider import ModelProvider
+from src.dobby_forge.providers.resilience import RetryPolicy
+from src.dobby_forge.providers.response_cache import ResponseCache
+from src.dobby_forge.providers.router import Endpoint, ModelRouter
+
+
+def make_provider(*servers, **policy) -> ModelProvider:
+    """A provider routed across the given fake servers, with fast retries."""
+    endpoints = [Endpoint(server.base_url, "test-key", "fake-model", name=f"fake{i}") for i, server in enumerate(servers)]
+    return ModelProvider(
+        api_key="test-key",
+        model="fake-model",
+        base_url=servers[0].base_url,
+        router=ModelRouter(endpoints),
+        retry_policy=RetryPolicy(**{"initial_backoff": 0.01, "max_backoff": 0.02, **policy}),
+        include_usage=False,
+    )
+
+
+async def collect(provider: ModelProvider, query: str = "hello", **kwargs) -> str:
+    try:
+        return "".join([chunk async for chunk in provider.query_stream(query, **kwargs)])
+    finally:
+        # Pooled clients are bound to the event loop of the test that created them
+        await close_clients()
+
+
+def test_sdk_does_not_retry_underneath_retry_policy(fake_server):
+    server = fake_server(fail_first=2, error_status=503)
+    provider = make_provider(server, max_attempts=1)
+    with pytest.raises(openai.InternalServerError):
+        asyncio.run(collect(provider))
+    # One attempt is one upstream call, and the failure reaches the router
+    assert server.requests == 1
+    stats = provider.router.stats[provider.router.primary]
+    assert stats.error_rate > 0
+    assert stats.breaker.failures == 1
+
+
+def test_retry_policy_retries_transient_failures(fake_server):
+    server = fake_server(fail_first=2, error_status=503)
+    provider = make_provider(server, max_attempts=3)
+    assert asyncio.run(collect(provider)) == " tok" * 8
+    assert server.requests == 3
+
+
+def test_fails_over_to_another_endpoint(fake_server):
+    broken = fake_server(error_rate=1.0, error_status=503)
+    healthy = fake_server()
+    provider = make_provider(broken, healthy, max_attempts=2)
+    assert asyncio.run(collect(provider)) == " tok" * 8
+    assert (broken.requests, healthy.requests) == (1, 1)
+
+
+def test_ejected_endpoint_is_skipped(fake_server):
+    broken = fake_server(error_rate=1.0, error_status=503)
+    healthy = fake_server()
+    provider = make_provider(broken, healthy, max_attempts=2)
+    provider.router = ModelRouter(provider.router.endpoints, failure_threshold=1, reset_timeout=60.0)
+    for _ in range(3):
+        asyncio.run(collect(provider))
+    # After the first failure the breaker is open and traffic goes straight to the healthy endpoint
+    assert (broken.requests, healthy.requests) == (1, 3)
+
+
+def test_hedged_request_wins_over_a_slow_first_token(fake_server):
+    slow = fake_server(ttft=2.0)
+    fast = fake_server()
+    provider = make_provider(slow, fast, hedge_after=0.1)
+    # Score the slow endpoint first so the primary attempt goes there
+    provider.router.record_success(provider.router.endpoints[0], 0.01)
+    provider.router.record_success(provider.router.endpoints[1], 0.02)
+
+    async def timed():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        text = await collect(provider)
+        return text, loop.time() - started
+
+    text, elapsed = asyncio.run(timed())
+    assert text == " tok" * 8
+    assert elapsed < 1.0
+    assert (slow.requests, fast.requests) == (1, 1)
+
+
+def test_stream_json_caches_objects_it_stopped_early(fake_server):
+    provider = make_provider(fake_server())
+    provider.cache = ResponseCache()
+    calls = []
+
+    async def fake_query_stream(query, **kwargs):
+        calls.append(query)
+        for chunk in ['Sure! {"task": ', '"CODE", "style": "BLUNT"}', " and some trailing chatter"]:
+            yield chunk
+
+    provider.query_stream = fake_query_stream
+
+    async def run():
+        return [await provider.query_json("describe") for _ in range(3)]
+
+    results = asyncio.run(run())
+    assert results == [{"task": "CODE", "style": "BLUNT"}] * 3
+    assert len(calls) == 1
+    assert provider.cache.hits == 2
+
+
+def test_cache_hit_streams_in_chunks_without_an_upstream_call(fake_server):
+    server = fake_server()
+    provider = make_provider(server)
+    provider.cache = ResponseCache(replay_chunk_size=5)
+
+    async def run():
+        first = await collect(provider)
+        replayed = [chunk async for chunk in provider.query_stream("hello")]
+        return first, replayed
+
+    first, replayed = asyncio.run(run())
+    assert "".join(replayed) == first == " tok" * 8
+    assert replayed[0] == " tok "
+    assert len(replayed) == 7
+    assert server.requests == 1
+    assert provider.cache.hits == 1
+
+
+def trip_breaker(provider: ModelProvider) -> ModelRouter:
+    """Replaces the router with one whose only endpoint is half-open, awaiting a probe."""
+    router = ModelRouter(provider.router.endpoints[:1], failure_threshold=1, reset_timeout=0.0)
+    router.record_failure(router.primary)
+    provider.router = router
+    return router
+
+
+def test_probe_ending_in_a_non_retryable_error_is_released(fake_server):
+    server = fake_server(fail_first=1, error_status=400)
+    provider = make_provider(server)
+    router = trip_breaker(provider)
+    with pytest.raises(openai.BadRequestError):
+        asyncio.run(collect(provider))
+    # The next request may probe again instead of failing with EndpointUnavailable
+    assert asyncio.run(collect(provider)) == " tok" * 8
+    assert router.stats[router.primary].breaker.state == "closed"
+
+
+def test_cancelled_probe_is_released(fake_server):
+    provider = make_provider(fake_server(ttft=5.0))
+    router = trip_breaker(provider)
+
+    async def cancel_mid_probe():
+        task = asyncio.create_task(collect(provider))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await close_clients()
+
+    asyncio.run(cancel_mid_probe())
+    assert router.pick() == router.primary
+
+
+def test_stream_json_stopped_on_required_keys_returns_no_partial_fields(fake_server):
+    provider = make_provider(fake_server())
+
+    async def fake_query_stream(query, **kwargs):
+        for chunk in ['{"task": "CODE", "persona": "Unhinged Fr', 'eedom Enthusiast"}']:
+            yield chunk
+
+    provider.query_stream = fake_query_stream
+    assert asyncio.run(provider.query_json("describe", required_keys=["task"])) == {"task": "CODE"}
@@ -0,0 +1,75 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src.dobby_forge.providers import response_cache
+from src.dobby_forge.providers.response_cache import MemoryCacheBackend, ResponseCache, SQLiteCacheBackend
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A settable clock for expiry and LRU order, in place of time.time()."""
+    now = SimpleNamespace(value=1000.0)
+
+    def tick():
+        now.value += 0.001
+        return now.value
+
+    monkeypatch.setattr(response_cache, "time", SimpleNamespace(time=tick))
+    return now
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryCacheBackend(max_entries=2)
+    return SQLiteCacheBackend(str(tmp_path / "cache.db"), max_entries=2)
+
+
+def test_entries_expire_after_their_ttl(backend, clock):
+    backend.set("a", "alpha", ttl=10)
+    assert backend.get("a") == "alpha"
+    clock.value += 11
+    assert backend.get("a") is None
+
+
+def test_least_recently_used_entry_is_evicted(backend, clock):
+    backend.set("a", "alpha", ttl=60)
+    backend.set("b", "beta", ttl=60)
+    # Reading "a" makes "b" the least recently used
+    assert backend.get("a") == "alpha"
+    backend.set("c", "gamma", ttl=60)
+    assert backend.get("b") is None
+    assert backend.get("a") == "alpha"
+    assert backend.get("c") == "gamma"
+
+
+def test_sqlite_entries_survive_a_restart(tmp_path, clock):
+    path = str(tmp_path / "cache.db")
+    SQLiteCacheBackend(path).set("a", "alpha", ttl=60)
+    assert SQLiteCacheBackend(path).get("a") == "alpha"
+
+
+def test_only_deterministic_requests_are_cacheable():
+    cache = ResponseCache()
+    assert cache.is_cacheable(0.0)
+    assert not cache.is_cacheable(0.7)
+    assert ResponseCache(deterministic_only=False).is_cacheable(0.7)
+
+
+def test_hits_and_misses_are_counted():
+    cache = ResponseCache()
+
+    async def run():
+        assert await cache.get("k") is None
+        await cache.set("k", "value")
+        return await cache.get("k")
+
+    assert asyncio.run(run()) == "value"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_replay_splits_a_response_into_chunks():
+    cache = ResponseCache(replay_chunk_size=4)
+    assert list(cache.replay("abcdefghij")) == ["abcd", "efgh", "ij"]
@@ -0,0 +1,45 @@
+import pytest
+
+from src.dobby_forge.providers.resilience import EndpointUnavailable
+from src.dobby_forge.providers.router import Endpoint, ModelRouter
+
+PRIMARY = Endpoint("http://primary/v1", "key", "model")
+SECONDARY = Endpoint("http://secondary/v1", "key", "model")
+
+
+def test_breaker_ejects_after_threshold():
+    router = ModelRouter([PRIMARY, SECONDARY], failure_threshold=2, reset_timeout=60.0)
+    router.record_failure(PRIMARY)
+    assert router.pick() == PRIMARY
+    router.record_failure(PRIMARY)
+    assert router.stats[PRIMARY].breaker.state == "open"
+    assert router.pick() == SECONDARY
+
+
+def test_half_open_endpoint_gets_a_single_probe():
+    router = ModelRouter([PRIMARY], failure_threshold=1, reset_timeout=0.0)
+    router.record_failure(PRIMARY)
+    assert router.stats[PRIMARY].breaker.state == "half_open"
+    assert router.pick() == PRIMARY
+    # The probe is still in flight: no second request may follow it
+    with pytest.raises(EndpointUnavailable):
+        router.pick()
+    router.record_success(PRIMARY, 0.1)
+    assert router.pick() == PRIMARY
+
+
+def test_busy_probe_falls_back_to_an_already_tried_closed_endpoint():
+    router = ModelRouter([PRIMARY, SECONDARY], failure_threshold=1, reset_timeout=0.0)
+    router.record_failure(SECONDARY)
+    assert router.pick(exclude=[PRIMARY]) == SECONDARY
+    assert router.pick(exclude=[PRIMARY]) == PRIMARY
+
+
+def test_released_probe_lets_the_next_request_probe():
+    router = ModelRouter([PRIMARY], failure_threshold=1, reset_timeout=0.0)
+    router.record_failure(PRIMARY)
+    assert router.pick() == PRIMARY
+    router.release_probe(PRIMARY)
+    assert router.pick() == PRIMARY
+    # Still half-open: releasing is not a success
+    assert router.stats[PRIMARY].breaker.state == "half_open"
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from src.dobby_forge.providers.single_flight import FlightCancelled, SingleFlight
+
+
+def counting_source(chunks, opened):
+    async def source():
+        opened.append(1)
+        for chunk in chunks:
+            await asyncio.sleep(0.01)
+            yield chunk
+    return source
+
+
+def test_concurrent_identical_requests_share_one_stream():
+    async def run():
+        flights, opened = SingleFlight(), []
+        open_source = counting_source(["a", "b", "c"], opened)
+
+        async def consume():
+            return [chunk async for chunk in flights.stream("key", open_source)]
+
+        return await asyncio.gather(consume(), consume()), opened
+
+    results, opened = asyncio.run(run())
+    assert results == [["a", "b", "c"], ["a", "b", "c"]]
+    assert len(opened) == 1
+
+
+def test_request_after_an_abandoned_flight_starts_a_new_stream():
+    async def run():
+        flights, opened = SingleFlight(), []
+        open_source = counting_source(["a", "b", "c"], opened)
+
+        leader = flights.stream("key", open_source)
+        assert await leader.__anext__() == "a"
+        # The only subscriber leaves, cancelling the upstream stream
+        await leader.aclose()
+
+        follower = [chunk async for chunk in flights.stream("key", open_source)]
+        return follower, opened
+
+    follower, opened = asyncio.run(run())
+    assert follower == ["a", "b", "c"]
+    assert len(opened) == 2
+
+
+def test_cancelled_flight_reports_an_error_not_a_clean_end():
+    async def run():
+        flights = SingleFlight()
+        stream = flights.stream("key", counting_source(["a", "b", "c"], []))
+        assert await stream.__anext__() == "a"
+        flight = flights._flights["key"]
+        queue = flight.subscribe()
+        flight._task.cancel()
+        await asyncio.sleep(0)
+        items = [queue.get_nowait() for _ in range(queue.qsize())]
+        await stream.aclose()
+        return items
+
+    items = asyncio.run(run())
+    assert items[0] == "a"
+    assert isinstance(items[-1], FlightCancelled)
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from src.dobby_forge.streaming import CoalesceConfig, pipe_stream
+
+
+class RecordingStream:
+    """Stands in for a response text stream, recording each emitted event."""
+
+    def __init__(self, fail: bool = False):
+        self.events = []
+        self.fail = fail
+
+    async def emit_chunk(self, chunk: str):
+        if self.fail:
+            raise ConnectionError("client went away")
+        self.events.append(chunk)
+
+
+async def source(*items, delay: float = 0.0):
+    for item in items:
+        if isinstance(item, Exception):
+            raise item
+        if delay:
+            await asyncio.sleep(delay)
+        yield item
+
+
+def test_buffer_flushes_once_it_reaches_max_bytes():
+    stream = RecordingStream()
+    config = CoalesceConfig(max_bytes=8, max_latency=10.0)
+    asyncio.run(pipe_stream(source("abcd", "efgh", "ij"), stream, config))
+    assert stream.events == ["abcdefgh", "ij"]
+
+
+def test_buffer_flushes_after_max_latency():
+    stream = RecordingStream()
+    config = CoalesceConfig(max_bytes=1024, max_latency=0.02)
+    asyncio.run(pipe_stream(source("a", "b", delay=0.1), stream, config))
+    assert stream.events == ["a", "b"]
+
+
+def test_upstream_error_is_raised_after_flushing_received_chunks():
+    stream = RecordingStream()
+    config = CoalesceConfig(max_bytes=1024, max_latency=10.0)
+    with pytest.raises(RuntimeError, match="upstream broke"):
+        asyncio.run(pipe_stream(source("a", "b", RuntimeError("upstream broke")), stream, config))
+    assert stream.events == ["ab"]
+
+
+def test_upstream_reader_is_cancelled_when_emitting_fails():
+    closed = asyncio.Event()
+
+    async def endless():
+        try:
+            while True:
+                await asyncio.sleep(0.001)
+                yield "x"
+        finally:
+            closed.set()
+
+    async def run():
+        config = CoalesceConfig(max_bytes=1, max_latency=10.0, queue_size=2)
+        with pytest.raises(ConnectionError):
+            await pipe_stream(endless(), RecordingStream(fail=True), config)
+        await asyncio.wait_for(closed.wait(), 1.0)
+
+    asyncio.run(run())